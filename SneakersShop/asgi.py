@@ -12,5 +12,14 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SneakersShop.settings')
+os.environ.setdefault('DJANGO_DEPLOYMENT_PROFILE', 'asgi')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.STARTUP_WARMUP:
+    # Воркер готовится до первого запроса; соединения прогрева закрываются, запросы откроют свои
+    from shop.warmup import warmup
+
+    warmup()
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -25,8 +27,15 @@ SECRET_KEY = 'django-insecure-j7e_jh26*%4yg1w=_xv^ttoo*b#bpb-5q(6nk!kd5-geh@(#sf
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 CORS_ALLOW_ALL_ORIGINS = True
+# WebApp передаёт подписанный initData и привязку к основной базе в заголовках, браузер спрашивает их в preflight
+CORS_ALLOW_HEADERS = (*default_headers, 'x-telegram-init-data', 'x-db-pin-primary')
+# Ответ на запись сообщает WebApp, сколько секунд читать с основной базы (shop/db_router.py)
+CORS_EXPOSE_HEADERS = ('x-db-pin-primary',)
 ALLOWED_HOSTS = ["*"]
 
+# Профиль развёртывания: "wsgi" (по умолчанию) или "asgi".
+# asgi.py выставляет "asgi": горячие read-эндпоинты каталога обслуживаются асинхронными view.
+DEPLOYMENT_PROFILE = os.environ.get('DJANGO_DEPLOYMENT_PROFILE', 'wsgi')
 
 
 # Application definition
@@ -48,7 +57,15 @@ INSTALLED_APPS = [
 ]
 INSTALLED_APPS += ['admin_auto_filters']
 
+# API-воркеры без админки стартуют быстрее: не импортируются admin, его расширения и shop/admin.py.
+# Админку обслуживает отдельный пул процессов с DJANGO_ADMIN_ENABLED=1 (по умолчанию)
+ADMIN_ENABLED = os.environ.get('DJANGO_ADMIN_ENABLED', '1') == '1'
+if not ADMIN_ENABLED:
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ('django.contrib.admin', 'admin_auto_filters')]
+
 MIDDLEWARE = [
+    # Первым: сжимает ответ после всех остальных middleware
+    'shop.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +74,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'shop.db_router.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'SneakersShop.urls'
@@ -78,22 +96,60 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'SneakersShop.wsgi.application'
+ASGI_APPLICATION = 'SneakersShop.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Постоянные соединения по профилю развёртывания. WSGI-воркер держит соединение
+# на поток и проверяет его перед первым запросом; под ASGI каждый запрос может
+# выполняться в новом потоке, поэтому соединения закрываются (используйте PgBouncer).
+DATABASE_CONNECTION_PROFILES = {
+    'wsgi': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+    'asgi': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+}
+_db_connection_profile = DATABASE_CONNECTION_PROFILES.get(DEPLOYMENT_PROFILE, DATABASE_CONNECTION_PROFILES['wsgi'])
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # PostgreSQL-бэкенд с метриками переиспользования соединений
+        'ENGINE': 'shop.db_backend',
         'NAME': 'sneakers-shop',
         'USER': 'admin',
         'PASSWORD': '0000',
         'HOST': 'localhost',
         'PORT': '5432',
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', _db_connection_profile['CONN_MAX_AGE'])),
+        'CONN_HEALTH_CHECKS': os.environ.get(
+            'DJANGO_DB_CONN_HEALTH_CHECKS', str(_db_connection_profile['CONN_HEALTH_CHECKS'])
+        ).lower() in ('1', 'true', 'yes'),
     }
 }
 
+# Реплики для чтения каталога: "host[:port][/name],..."; пусто — все запросы на основную базу
+DATABASE_REPLICAS = []
+for _index, _replica in enumerate(filter(None, os.environ.get('DJANGO_DB_REPLICA_HOSTS', '').split(',')), start=1):
+    _address, _, _name = _replica.strip().partition('/')
+    _host, _, _port = _address.partition(':')
+    DATABASES[f'replica_{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'NAME': _name or DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+
+DATABASE_ROUTERS = ['shop.db_router.ReadReplicaRouter']
+# Сколько секунд после записи клиент читает с основной базы
+DATABASE_REPLICA_PIN_SECONDS = 5
+# Сколько секунд не обращаться к недоступной реплике
+DATABASE_REPLICA_RETRY_SECONDS = 30
+
+# Ожидаемое число соединений на процесс (потоки воркера): знаменатель open_connections_ratio в /api/metrics/db/
+DATABASE_MAX_CONNECTIONS_PER_PROCESS = int(os.environ.get('DJANGO_DB_MAX_CONNECTIONS_PER_PROCESS', 1))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -141,8 +197,111 @@ STATICFILES_DIRS = [
 # Медиа файлы (загрузки пользователей)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Отдача медиа без копирования байтов через Python: "x-accel" (nginx), "x-sendfile" (Apache/lighttpd)
+# или "sendfile" (FileResponse + wsgi.file_wrapper). Пусто — только static() при DEBUG
+MEDIA_SERVING_MODE = os.environ.get('MEDIA_SERVING_MODE', '')
+# internal location nginx, указывающий на MEDIA_ROOT
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = 3600
+
+# Фоновая обработка загруженных изображений (варианты WebP/JPEG в MEDIA_ROOT/variants/)
+IMAGE_PIPELINE_ENABLED = True
+IMAGE_PIPELINE_WORKERS = 2
+IMAGE_VARIANT_WIDTHS = (160, 320, 640, 1280)
+IMAGE_VARIANT_QUALITY = 82
+# Ширина варианта, который отдаётся в API в base64
+IMAGE_API_VARIANT_WIDTH = 640
+# Ширина миниатюр в снимке каталога
+IMAGE_THUMBNAIL_WIDTH = 320
+
+# Статический снимок каталога для WebApp
+CATALOG_SNAPSHOT_DIR = os.path.join(MEDIA_ROOT, 'catalog')
+CATALOG_SNAPSHOT_URL = f'{MEDIA_URL}catalog/'
+# Префикс URL изображений в снимке (например, адрес CDN)
+CATALOG_SNAPSHOT_BASE_URL = os.environ.get('CATALOG_SNAPSHOT_BASE_URL', '')
+CATALOG_SNAPSHOT_AUTO_REBUILD = True
+CATALOG_SNAPSHOT_DEBOUNCE_SECONDS = 5
+CATALOG_SNAPSHOT_KEEP_VERSIONS = 3
+
+# Общий кеш для всех процессов, например "redis://127.0.0.1:6379/1" (нужен пакет redis).
+# Без него у каждого процесса свой LocMemCache и прогрев виден только в нём
+CACHE_URL = os.environ.get('DJANGO_CACHE_URL', '')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+
+# Кеш ответов API каталога (карточки товаров, списки по категории и бренду),
+# прогревается в фоне после изменений каталога. Работает только с общим кешем (DJANGO_CACHE_URL):
+# с LocMemCache остальные процессы не видели бы прогрева и отдавали устаревшие цены и остатки
+CATALOG_CACHE_ENABLED = True
+CATALOG_CACHE_TIMEOUT = 600
+CATALOG_CACHE_WARM_DELAY = 1
+
+# Поток изменений остатков и цен (SSE, только ASGI): /api/stock/stream/?products=...
+# "auto" — PostgreSQL LISTEN/NOTIFY между процессами, на других СУБД — в пределах процесса
+STOCK_EVENTS_ENABLED = True
+STOCK_EVENTS_BACKEND = os.environ.get('STOCK_EVENTS_BACKEND', 'auto')
+STOCK_EVENTS_MAX_PRODUCTS = 50
+# Ограничение буфера одного клиента (размеров); при переполнении клиент получает resync
+STOCK_EVENTS_BUFFER_SIZE = 256
+STOCK_EVENTS_COALESCE_SECONDS = 0.25
+STOCK_EVENTS_HEARTBEAT_SECONDS = 15
+STOCK_EVENTS_RETRY_MS = 3000
+# Максимальная длительность одного потока: отключившийся клиент держит подписку не дольше этого
+STOCK_EVENTS_MAX_STREAM_SECONDS = 300
+# Одновременных потоков на процесс; сверх лимита — 503. Подключения ограничены CATALOG_THROTTLE_*, как каталог
+STOCK_EVENTS_MAX_STREAMS = int(os.environ.get('STOCK_EVENTS_MAX_STREAMS', 500))
+
+# Ограничение частоты запросов к каталогу: по Telegram id из подписанного initData WebApp
+# (заголовок X-Telegram-Init-Data), без него — по IP. Счётчики хранятся в CACHES
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_RATES': {
+        'catalog_burst': os.environ.get('CATALOG_THROTTLE_BURST', '20/s'),
+        'catalog_sustained': os.environ.get('CATALOG_THROTTLE_SUSTAINED', '600/m'),
+    },
+    # Число прокси (nginx) перед приложением: IP клиента берётся из X-Forwarded-For.
+    # Задаётся явно за прокси; без прокси заголовку верить нельзя — клиент подставит любой IP
+    'NUM_PROXIES': int(os.environ['DJANGO_NUM_PROXIES']) if os.environ.get('DJANGO_NUM_PROXIES') else None,
+}
+# Токен бота для проверки подписи initData
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '')
+TELEGRAM_INIT_DATA_MAX_AGE = 86400
+
+# Сжатие ответов API (brotli, если установлен пакет brotli, иначе gzip)
+COMPRESSION_ENABLED = True
+COMPRESSION_PATH_PREFIXES = ('/api/',)
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+# Память процесса под уже сжатые тела повторяющихся GET-ответов
+COMPRESSION_CACHE_MAX_BYTES = 16 * 1024 * 1024
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Популярность товаров: просмотры и заказы копятся в памяти процесса и пишутся пачкой
+POPULARITY_ENABLED = True
+POPULARITY_FLUSH_SECONDS = 5
+# Пересчёт затухающей популярности (или management-команда update_popularity по cron)
+POPULARITY_SCORE_SECONDS = 300
+POPULARITY_HALF_LIFE_HOURS = 72
+POPULARITY_VIEW_WEIGHT = 1
+POPULARITY_ORDER_WEIGHT = 20
+# Токен, с которым бот проверяет и сообщает о заказах (POST /api/orders/validate/ и
+# /api/orders/record/, заголовок X-Service-Token); без него эндпоинты закрыты
+SHOP_SERVICE_TOKEN = os.environ.get('SHOP_SERVICE_TOKEN', '')
+
+# Похожие товары: /api/products/<id>/similar/, списки строит команда build_similar_products (нужен numpy)
+SIMILAR_PRODUCTS_COUNT = 12
+
+# Прогрев воркера до приёма запросов (shop/warmup.py): URLconf, классы DRF, проверка соединений с БД
+# и горячие записи кеша. Выполняется при импорте wsgi.py/asgi.py; открытые прогревом соединения
+# закрываются, поэтому он безопасен и в мастере gunicorn --preload
+STARTUP_WARMUP = os.environ.get('DJANGO_STARTUP_WARMUP', '1') == '1'
+STARTUP_WARMUP_CACHE = True
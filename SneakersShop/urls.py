@@ -14,10 +14,11 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.conf import settings
 from django.conf.urls.static import static
-from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 from shop.views import *
 
@@ -26,13 +27,45 @@ router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'products', ProductViewSet, basename='product')
 router.register(r'brands', BrandViewSet, basename='brand')
-urlpatterns = [
-    path('admin/', admin.site.urls),
-]
+router.register(r'orders', OrderViewSet, basename='order')
+router.register(r'metrics', MetricsViewSet, basename='metrics')
+urlpatterns = []
+
+if settings.ADMIN_ENABLED:
+    from django.contrib import admin
+
+    urlpatterns += [
+        path('admin/', admin.site.urls),
+    ]
+
+if settings.DEPLOYMENT_PROFILE == 'asgi':
+    from shop.async_views import AsyncBrandView, AsyncCategoryView, AsyncProductView, StockStreamView
+
+    # Асинхронные list/retrieve перекрывают соответствующие маршруты роутера
+    urlpatterns += [
+        path('api/categories/', AsyncCategoryView.as_view()),
+        path('api/categories/<uuid:pk>/', AsyncCategoryView.as_view()),
+        path('api/brands/', AsyncBrandView.as_view()),
+        path('api/brands/<uuid:pk>/', AsyncBrandView.as_view()),
+        path('api/products/', AsyncProductView.as_view()),
+        path('api/products/<uuid:pk>/', AsyncProductView.as_view()),
+        # SSE держит соединение открытым, поэтому доступен только под ASGI
+        path('api/stock/stream/', StockStreamView.as_view()),
+    ]
+
 urlpatterns += [
     path('api/', include(router.urls)),
 ]
 
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+
+if settings.MEDIA_SERVING_MODE:
+    from shop.media import serve_media
+
+    # Файлы отдаёт фронтовый сервер или sendfile(), Python их не читает
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media),
+    ]
+elif settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
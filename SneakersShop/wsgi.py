@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SneakersShop.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.STARTUP_WARMUP:
+    # Воркер готовится до первого запроса, а не во время него. С gunicorn --preload прогрев идёт
+    # в мастере: открытые им соединения закрываются, чтобы воркеры не делили его сокет
+    from shop.warmup import warmup
+
+    warmup()
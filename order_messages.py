@@ -0,0 +1,115 @@
+# order_messages.py
+# Тексты заказов для Telegram (MarkdownV2); модуль не зависит от бота и его настроек
+
+# Специальные символы MarkdownV2, которые нужно экранировать вне разметки
+MARKDOWN_SPECIAL_CHARS = r'_*[]()~`>#+-=|{}.!\\'
+_MARKDOWN_ESCAPE_TABLE = str.maketrans({char: '\\' + char for char in MARKDOWN_SPECIAL_CHARS})
+
+
+def escape_markdown(value) -> str:
+    """
+    Escapes a user-supplied value for insertion into a MarkdownV2 template.
+
+    Args:
+        value: Any value; it is converted to str first.
+
+    Returns:
+        str: The escaped string.
+    """
+    if value is None:
+        return ''
+    return str(value).translate(_MARKDOWN_ESCAPE_TABLE)
+
+
+# Шаблоны сообщений: статический текст уже экранирован для MarkdownV2,
+# пользовательские поля экранируются в момент подстановки
+ADMIN_ORDER_TEMPLATE = (
+    "🛒 *НОВЫЙ ЗАКАЗ* {order_id}\n\n"
+    "👤 *Клиент:* \\[{full_name}\\]\n"
+    "🔗 @{username}\n"
+    "🆔 ID: `{user_id}`\n"
+    "📅 *Дата:* {order_date}\n\n"
+    "📋 *Состав заказа:*\n"
+    "{items}"
+    "\n💵 *Итого:* {total} руб\n"
+    "🚚 *Тип:* {order_type}"
+    "{warnings}"
+)
+
+ADMIN_WARNINGS_TEMPLATE = "\n\n⚠️ *Проверка заказа:*\n{lines}"
+
+USER_ORDER_TEMPLATE = (
+    "✅ *Спасибо за заказ*\n\n"
+    "{full_name}, ваш заказ успешно оформлен\\.\n"
+    "Наш менеджер свяжется с вами в ближайшее время для уточнения деталей\\.\n\n"
+    "*Номер заказа:* {order_id}\n"
+    "*Сумма заказа:* {total} руб\n\n"
+    "*Состав заказа:*\n"
+    "{items}"
+    "\n💰*Оплата*: \nПереводом на карту"
+)
+
+ADMIN_ITEM_TEMPLATE = (
+    "\n• {title}\n"
+    "  Размер: {size}\n"
+    "  Цвет: {color}\n"
+    "  Цена: {price} руб × {quantity} шт\n"
+)
+
+USER_ITEM_TEMPLATE = (
+    " • {title}\n"
+    "  Размер: {size}\n"
+    "  Цвет: {color}\n"
+    "  Цена: {price} руб × {quantity} шт\n"
+)
+
+
+def format_price(value) -> str:
+    """Форматирует цену с двумя знаками и экранирует точку"""
+    return escape_markdown(f"{float(value):.2f}")
+
+
+def render_order_items(items: list, template: str) -> str:
+    """Собирает список товаров заказа за один проход"""
+    return ''.join(
+        template.format(
+            title=escape_markdown(item['title']),
+            size=escape_markdown(item['size']),
+            color=escape_markdown(item['color']),
+            price=format_price(item['price']),
+            quantity=escape_markdown(item['quantity']),
+        )
+        for item in items
+    )
+
+
+def build_admin_message(order_id, user_data: dict, full_name: str, order_date: str,
+                        items: list, total_amount, warnings: list = None) -> str:
+    """Формирует экранированное сообщение-чек для администратора"""
+    is_pre_order = bool(items) and items[0].get('isPreOrder', False)
+    warnings_block = ''
+    if warnings:
+        warnings_block = ADMIN_WARNINGS_TEMPLATE.format(
+            lines='\n'.join(f"• {escape_markdown(warning)}" for warning in warnings)
+        )
+    return ADMIN_ORDER_TEMPLATE.format(
+        order_id=escape_markdown(order_id),
+        full_name=escape_markdown(full_name),
+        username=escape_markdown(user_data['username']),
+        user_id=escape_markdown(user_data['id']),
+        order_date=escape_markdown(order_date),
+        items=render_order_items(items, ADMIN_ITEM_TEMPLATE),
+        total=format_price(total_amount),
+        order_type='Предзаказ' if is_pre_order else 'В наличии',
+        warnings=warnings_block,
+    )
+
+
+def build_user_message(order_id, full_name: str, items: list, total_amount) -> str:
+    """Формирует экранированное подтверждение заказа для пользователя"""
+    return USER_ORDER_TEMPLATE.format(
+        order_id=escape_markdown(order_id),
+        full_name=escape_markdown(full_name),
+        items=render_order_items(items, USER_ITEM_TEMPLATE),
+        total=format_price(total_amount),
+    )
@@ -0,0 +1,160 @@
+# Сравнение профилей WSGI (gunicorn, sync-воркеры) и ASGI (uvicorn) под медленными клиентами:
+#   python scripts/benchmark_asgi_wsgi.py [--slow-clients 50] [--duration 10] [--concurrency 10]
+# Нужны gunicorn и uvicorn. Настройки берутся из DJANGO_SETTINGS_MODULE (по умолчанию SneakersShop.settings).
+# Медленные клиенты держат соединения, передавая заголовки по одному в секунду; в это время
+# быстрые клиенты делают запросы к каталогу, замеряются пропускная способность и задержки
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def server_command(profile, host, port, workers):
+    address = f'{host}:{port}'
+    if profile == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', 'SneakersShop.wsgi:application',
+                '--workers', str(workers), '--bind', address, '--log-level', 'warning']
+    return [sys.executable, '-m', 'uvicorn', 'SneakersShop.asgi:application',
+            '--workers', str(workers), '--host', host, '--port', str(port), '--log-level', 'warning']
+
+
+async def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+async def slow_client(host, port, path, stop):
+    """Отправляет заголовки по одному в секунду, пока идёт замер"""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        return
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'.encode())
+        index = 0
+        while not stop.is_set():
+            writer.write(f'X-Slow-{index}: 1\r\n'.encode())
+            await writer.drain()
+            index += 1
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+        writer.write(b'Connection: close\r\n\r\n')
+        await writer.drain()
+        await asyncio.wait_for(reader.read(), timeout=5)
+    except (OSError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+
+
+async def fast_load(url, duration, concurrency):
+    """Быстрые клиенты шлют запросы подряд ``duration`` секунд"""
+    latencies = []
+    errors = unfinished = 0
+    deadline = time.monotonic() + duration
+
+    async def worker(session):
+        nonlocal errors, unfinished
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                timeout = aiohttp.ClientTimeout(total=max(deadline - time.monotonic(), 0.1))
+                async with session.get(url, timeout=timeout) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except asyncio.TimeoutError:
+                # Ответ не пришёл до конца замера
+                unfinished += 1
+                break
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return elapsed, latencies, errors, unfinished
+
+
+async def measure(args):
+    url = f'http://{args.host}:{args.port}{args.path}'
+    await wait_ready(url)
+    stop = asyncio.Event()
+    slow = [asyncio.ensure_future(slow_client(args.host, args.port, args.path, stop)) for _ in range(args.slow_clients)]
+    # Даём медленным клиентам занять соединения
+    await asyncio.sleep(1)
+    elapsed, latencies, errors, unfinished = await fast_load(url, args.duration, args.concurrency)
+    stop.set()
+    await asyncio.gather(*slow)
+
+    latencies.sort()
+    ok = len(latencies)
+    return {
+        'rps': ok / elapsed if elapsed else 0,
+        'p50': statistics.median(latencies) if latencies else None,
+        'p95': latencies[int(ok * 0.95) - 1] if ok >= 20 else None,
+        'errors': errors,
+        'unfinished': unfinished,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WSGI vs ASGI throughput under concurrent slow clients")
+    parser.add_argument('--path', default='/api/products/?limit=20')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help="Server processes for both profiles")
+    parser.add_argument('--slow-clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10, help="Seconds of fast load per profile")
+    parser.add_argument('--concurrency', type=int, default=10, help="Concurrent fast clients")
+    parser.add_argument('--profiles', nargs='*', default=['wsgi', 'asgi'])
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'SneakersShop.settings')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [BASE_DIR, env.get('PYTHONPATH')]))
+    # Все запросы идут с одного адреса, ограничение частоты каталога не должно вмешиваться
+    env['CATALOG_THROTTLE_BURST'] = env['CATALOG_THROTTLE_SUSTAINED'] = '1000000/s'
+
+    for profile in args.profiles:
+        server = subprocess.Popen(
+            server_command(profile, args.host, args.port, args.workers),
+            env={**env, 'DJANGO_DEPLOYMENT_PROFILE': profile}, cwd=BASE_DIR
+        )
+        try:
+            result = asyncio.run(measure(args))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        latency = ' '.join(
+            f"{name} {result[name]:.1f} ms" for name in ('p50', 'p95') if result[name] is not None
+        ) or 'no responses'
+        print(f"{profile}: {result['rps']:.1f} req/s, {latency}, errors {result['errors']}, "
+              f"unanswered at the end {result['unfinished']} "
+              f"({args.slow_clients} slow clients, {args.workers} workers)")
+
+
+if __name__ == '__main__':
+    main()
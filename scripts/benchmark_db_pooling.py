@@ -0,0 +1,112 @@
+# Запросы в секунду с постоянными соединениями к БД (CONN_MAX_AGE) и без них:
+#   python scripts/benchmark_db_pooling.py [--path /api/brands/] [--requests 2000] [--concurrency 8]
+# Настройки берутся из DJANGO_SETTINGS_MODULE (по умолчанию SneakersShop.settings, нужен PostgreSQL).
+# Каждый режим запускается в отдельном процессе; WSGI-обработчик Django вызывается из потоков
+# напрямую, сигналы начала и конца запроса открывают и закрывают соединения как под gunicorn
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    'no-pooling': 0,
+    'persistent': 600,
+}
+
+
+def run_child(path, total, concurrency, conn_max_age):
+    sys.path.insert(0, BASE_DIR)
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+
+    for alias in connections:
+        connections[alias].settings_dict['CONN_MAX_AGE'] = conn_max_age
+    handler = WSGIHandler()
+    statuses = []
+    lock = threading.Lock()
+
+    def request(_):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1', 'HTTP_HOST': 'localhost',
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        status = []
+        response = handler(environ, lambda value, headers, exc_info=None: status.append(value))
+        try:
+            b''.join(response)
+        finally:
+            # close() отправляет request_finished: соединение закрывается или остаётся открытым
+            response.close()
+        with lock:
+            statuses.append(int(status[0].split()[0]))
+
+    # Прогрев: импорт URLconf и первые соединения не входят в замер
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(request, range(concurrency)))
+    statuses.clear()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(request, range(total)))
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'rps': round(total / elapsed, 1),
+        'ms_per_request': round(elapsed / total * 1000 * concurrency, 2),
+        'errors': sum(status >= 400 for status in statuses),
+    }
+    if settings.DATABASES['default']['ENGINE'] == 'shop.db_backend':
+        from shop.db_backend.base import metrics
+        report['db'] = metrics.snapshot()
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests/sec with and without persistent database connections")
+    parser.add_argument('--path', default='/api/brands/', help="Endpoint with a database query")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8, help="Threads, as in a threaded WSGI worker")
+    parser.add_argument('--child', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.path, args.requests, args.concurrency, args.child)
+        return
+
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'SneakersShop.settings')
+    # Все запросы идут с одного адреса, ограничение частоты каталога не должно вмешиваться
+    env['CATALOG_THROTTLE_BURST'] = env['CATALOG_THROTTLE_SUSTAINED'] = '1000000/s'
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [BASE_DIR, env.get('PYTHONPATH')]))
+
+    results = {}
+    for mode, conn_max_age in MODES.items():
+        result = subprocess.run(
+            [sys.executable, __file__, '--path', args.path, '--requests', str(args.requests),
+             '--concurrency', str(args.concurrency), '--child', str(conn_max_age)],
+            env=env, cwd=BASE_DIR, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            sys.exit(f"{mode} failed:\n{result.stderr}")
+        results[mode] = report = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{mode:<12} {report['rps']:8.1f} req/s  {report['ms_per_request']:6.2f} ms/request  "
+              f"errors {report['errors']}" + (f"  db {report['db']}" if 'db' in report else ''))
+
+    baseline = results['no-pooling']['rps']
+    if baseline:
+        print(f"persistent / no-pooling: {results['persistent']['rps'] / baseline:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# Микробенчмарк форматирования заказа для Telegram:
+#   python scripts/benchmark_order_messages.py [--items 50] [--runs 1000]
+# Импортирует только order_messages, настройки и токен бота не нужны
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_messages import build_admin_message, build_user_message  # noqa: E402
+
+
+def benchmark_order_messages(items_count: int = 50, runs: int = 1000) -> dict:
+    """
+    Renders the admin and user messages of an order with ``items_count`` lines
+    whose fields contain MarkdownV2 special characters.
+
+    Returns:
+        dict: Message name -> best mean time per message in milliseconds.
+    """
+    items = [
+        {
+            'title': f"Air Max 90 (v{index}) - limited_edition!",
+            'size': '42.5',
+            'color': 'black/white [#1]',
+            'price': 12990.5 + index,
+            'quantity': 1 + index % 3,
+        }
+        for index in range(items_count)
+    ]
+    user_data = {'id': 123456789, 'username': 'test_user'}
+    total_amount = sum(item['price'] * item['quantity'] for item in items)
+    cases = {
+        'admin': lambda: build_admin_message(
+            '#A-1', user_data, 'Test User', '01.01.2025 12:00', items, total_amount, ['Цена изменилась']
+        ),
+        'user': lambda: build_user_message('#A-1', 'Test User', items, total_amount),
+    }
+    return {
+        name: min(timeit.repeat(case, number=runs, repeat=5)) / runs * 1000
+        for name, case in cases.items()
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Order message formatting microbenchmark")
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--runs', type=int, default=1000)
+    args = parser.parse_args()
+    for name, elapsed_ms in benchmark_order_messages(args.items, args.runs).items():
+        print(f"{name} message, {args.items} items: {elapsed_ms:.3f} ms")
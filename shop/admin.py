@@ -1,11 +1,16 @@
 # admin.py
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
 from django.utils.html import format_html
-from django.urls import reverse
+from django.urls import reverse, path
 from django import forms
+from django.db import DataError, IntegrityError
+from django.db.models import Count, Min, Max, Sum
+from django.template.response import TemplateResponse
 from mptt.admin import DraggableMPTTAdmin
 
 from .models import *
+from .catalog_import import import_stock, iter_rows
 from admin_auto_filters.filters import AutocompleteFilter
 
 class ProductFilter(AutocompleteFilter):
@@ -32,10 +37,10 @@ class CategoryAdmin(DraggableMPTTAdmin):
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.prefetch_related('products')
+        return qs.annotate(_product_count=Count('products', distinct=True))
 
     def product_count(self, instance):
-        return instance.products.count()
+        return instance._product_count
 
     def image_preview(self, obj):
         if obj.image:
@@ -45,6 +50,7 @@ class CategoryAdmin(DraggableMPTTAdmin):
     image_preview.short_description = "Превью"
 
     product_count.short_description = 'Товаров в категории'
+    product_count.admin_order_field = '_product_count'
 
 class ProductCategoryInline(admin.TabularInline):
     model = ProductCategory
@@ -117,6 +123,16 @@ class ProductModelAdmin(admin.ModelAdmin):
     search_fields = ('sku', 'product__title', 'color')
     inlines = [ModelSizeInline, ModelImageInline]  # Используем новый ModelImageInline
     autocomplete_fields = ['product']
+    list_select_related = ('product',)
+
+    def get_queryset(self, request):
+        # Цены и остаток считаются одним запросом для всего списка
+        qs = super().get_queryset(request)
+        return qs.annotate(
+            _min_price=Min('sizes__price'),
+            _max_price=Max('sizes__price'),
+            _stock_sum=Sum('sizes__stock'),
+        )
 
     def product_link(self, obj):
         url = reverse('admin:shop_product_change', args=[obj.product.id])
@@ -124,21 +140,67 @@ class ProductModelAdmin(admin.ModelAdmin):
     product_link.short_description = 'Товар'
 
     def stock_sum(self, obj):
-        return sum(obj.sizes.values_list('stock', flat=True))
+        return obj._stock_sum or 0
     stock_sum.short_description = 'Общий остаток'
+    stock_sum.admin_order_field = '_stock_sum'
 
     def min_price(self, obj):
-        return obj.min_price
+        return obj._min_price or 0
     min_price.short_description = 'Мин. цена'
+    min_price.admin_order_field = '_min_price'
 
     def max_price(self, obj):
-        return obj.max_price
+        return obj._max_price or 0
     max_price.short_description = 'Макс. цена'
+    max_price.admin_order_field = '_max_price'
+
+class CatalogImportForm(forms.Form):
+    file = forms.FileField(label='Файл CSV/XLSX')
+    dry_run = forms.BooleanField(label='Только показать изменения', required=False, initial=True)
+
 
 @admin.register(ModelSize)
 class ModelSizeAdmin(admin.ModelAdmin):
     list_display = ('size', 'model_link', 'stock')
     search_fields = ('model__sku', 'size')
+    list_select_related = ('model',)
+
+    def get_urls(self):
+        urls = [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_view),
+                name='shop_modelsize_import'
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        report = None
+        form = CatalogImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = import_stock(iter_rows(upload, upload.name), dry_run=form.cleaned_data['dry_run'])
+            except (ValueError, ImportError) as e:
+                messages.error(request, str(e))
+            except (DataError, IntegrityError) as e:
+                # Пакет с ошибкой откатывается целиком, предыдущие пакеты уже сохранены
+                messages.error(request, f"Ошибка записи в базу, импорт остановлен: {e}")
+            else:
+                messages.success(request, report.summary())
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Импорт размеров, цен и остатков',
+            'opts': self.model._meta,
+            'form': form,
+            'report': report,
+        }
+        return TemplateResponse(request, 'admin/shop/modelsize/import.html', context)
 
     def model_link(self, obj):
         url = reverse('admin:shop_productmodel_change', args=[obj.model.id])
@@ -146,4 +208,15 @@ class ModelSizeAdmin(admin.ModelAdmin):
     model_link.short_description = 'Модель'
 
 # Изменили регистрацию модели
-admin.site.register(ModelImage)
\ No newline at end of file
+admin.site.register(ModelImage)
+
+
+@admin.register(ProcessedImage)
+class ProcessedImageAdmin(admin.ModelAdmin):
+    list_display = ('original', 'status', 'width', 'height', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('original', 'content_hash', 'perceptual_hash')
+    readonly_fields = (
+        'original', 'status', 'width', 'height', 'content_hash', 'perceptual_hash',
+        'variants', 'error', 'created_at', 'processed_at'
+    )
\ No newline at end of file
@@ -0,0 +1,317 @@
+# async_views.py
+import asyncio
+import logging
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+
+from .models import *
+from .serializers import *
+from .serializers import encode_image
+from .catalog_cache import PRODUCT, cache_enabled, get_or_build, listing_cache_entry
+from .fieldsets import FieldSet
+from .pagination import KeysetPagination
+from .popularity import record_view
+from .singleflight import async_flight, query_key
+from .stock_events import broadcaster, format_sse
+from .throttling import CATALOG_THROTTLES
+from .views import apply_product_fieldset, filter_products
+
+logger = logging.getLogger(__name__)
+
+
+def _main_image_file(product):
+    # Та же логика, что в ProductListSerializer.get_main_image
+    if product.image:
+        return product.image
+    images = [image for product_model in product.models.all() for image in product_model.images.all()]
+    main_image = next((image for image in images if image.is_main), None) or next(iter(images), None)
+    return main_image.image if main_image else None
+
+
+def collect_image_files(serializer_class, instances, fieldset=None):
+    """Собирает файлы изображений, которые сериализатор прочитает для ответа"""
+    files = []
+    for instance in instances:
+        if serializer_class in (ProductListSerializer, ProductDetailSerializer):
+            fieldset = fieldset or FieldSet(serializer_class.Meta.fields)
+            if fieldset.wants('main_image'):
+                files.append(_main_image_file(instance))
+            if fieldset.wants('brand') and fieldset.is_expanded('brand') and instance.brand:
+                files.append(instance.brand.logo)
+            if fieldset.wants('models') and fieldset.is_expanded('models'):
+                for product_model in instance.models.all():
+                    files.extend(image.image for image in product_model.images.all())
+        elif serializer_class is BrandSerializer:
+            files.append(instance.logo)
+        elif serializer_class is CategorySerializer:
+            files.append(instance.image)
+    return [file for file in files if file]
+
+
+async def preload_images(files):
+    """
+    Reads image files in worker threads concurrently.
+
+    Returns:
+        dict: file name -> base64 string (None if the file can't be read).
+    """
+    unique_files = {file.name: file for file in files}
+
+    async def read(file):
+        try:
+            return await asyncio.to_thread(encode_image, file)
+        except Exception:
+            logger.exception("Error encoding image %s", file.name)
+            return None
+
+    contents = await asyncio.gather(*(read(file) for file in unique_files.values()))
+    return dict(zip(unique_files, contents))
+
+
+class ThrottledAsyncView(View):
+    """Async view that applies DRF throttle classes before the handler runs."""
+    throttle_classes = CATALOG_THROTTLES
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Те же ограничения частоты, что и у DRF-представлений каталога
+        wait = await sync_to_async(self.check_throttles)(request)
+        if wait is not None:
+            response = self.render({'detail': 'Request was throttled.'}, status=429)
+            response['Retry-After'] = str(int(wait) + 1)
+            return response
+        return await super().dispatch(request, *args, **kwargs)
+
+    def check_throttles(self, request):
+        """Секунды до следующего разрешённого запроса или None"""
+        waits = []
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not throttle.allow_request(request, self):
+                waits.append(throttle.wait() or 0)
+        return max(waits) if waits else None
+
+    @staticmethod
+    def render(data, status=200, headers=None):
+        return HttpResponse(
+            JSONRenderer().render(data),
+            status=status,
+            content_type='application/json',
+            headers=headers
+        )
+
+
+class AsyncReadOnlyView(ThrottledAsyncView):
+    """
+    Async counterpart of a DRF ReadOnlyModelViewSet list/retrieve action.
+
+    Objects are loaded with the async ORM, image files are read off the event loop,
+    and the existing DRF serializers render the response.
+    """
+    serializer_class = None
+    detail_serializer_class = None
+    pagination_class = None
+
+    async def get_queryset(self, request):
+        raise NotImplementedError
+
+    def get_fieldset(self, request, serializer_class):
+        return None
+
+    async def get(self, request, pk=None):
+        # Одинаковые одновременные запросы вычисляются один раз, ответ общий
+        key = (type(self).__name__, pk, query_key(request.GET))
+        content, status, headers = await async_flight.do(key, lambda: self.build_response(request, pk))
+        return HttpResponse(content, status=status, content_type='application/json', headers=headers)
+
+    async def build_response(self, request, pk):
+        response = await self.load(request, pk)
+        return response.content, response.status_code, {
+            name: value for name, value in response.items() if name != 'Content-Type'
+        }
+
+    async def load(self, request, pk=None):
+        queryset = await self.get_queryset(request)
+        headers = {}
+        if pk is None:
+            serializer_class = self.serializer_class
+            paginator = self.pagination_class() if self.pagination_class else None
+            try:
+                page_queryset = paginator.get_page_queryset(queryset, request) if paginator else None
+            except NotFound as e:
+                return self.render({'detail': str(e.detail)}, status=404)
+            if page_queryset is None:
+                instances = [instance async for instance in queryset]
+            else:
+                instances = paginator.set_page([instance async for instance in page_queryset])
+                headers = paginator.get_response_headers()
+            many = True
+        else:
+            serializer_class = self.detail_serializer_class or self.serializer_class
+            try:
+                instances = [instance async for instance in queryset.filter(pk=pk)[:1]]
+            except (TypeError, ValueError, ValidationError):
+                instances = []
+            if not instances:
+                return self.render({'detail': 'Not found.'}, status=404)
+            many = False
+
+        fieldset = self.get_fieldset(request, serializer_class)
+        image_cache = await preload_images(collect_image_files(serializer_class, instances, fieldset))
+        serializer = serializer_class(
+            instances if many else instances[0],
+            many=many,
+            context={'request': request, 'image_cache': image_cache, 'fieldset': fieldset}
+        )
+        return self.render(serializer.data, headers=headers)
+
+
+class AsyncCategoryView(AsyncReadOnlyView):
+    serializer_class = CategorySerializer
+
+    async def get_queryset(self, request):
+        return Category.objects.filter(is_active=True).select_related('parent').order_by('tree_id', 'lft')
+
+
+class AsyncBrandView(AsyncReadOnlyView):
+    serializer_class = BrandSerializer
+
+    async def get_queryset(self, request):
+        return Brand.objects.filter(is_active=True)
+
+
+class AsyncProductView(AsyncReadOnlyView):
+    serializer_class = ProductListSerializer
+    detail_serializer_class = ProductDetailSerializer
+    pagination_class = KeysetPagination
+
+    async def get_queryset(self, request):
+        queryset = Product.objects.filter(is_active=True)
+        if self.kwargs.get('pk') is None:
+            # Фильтр по категории делает синхронный запрос, выполняем его в потоке
+            queryset = await sync_to_async(filter_products)(queryset, request.GET)
+        serializer_class = self.serializer_class if self.kwargs.get('pk') is None else self.detail_serializer_class
+        return apply_product_fieldset(queryset, self.get_fieldset(request, serializer_class))
+
+    def get_fieldset(self, request, serializer_class):
+        return FieldSet.from_query_params(request.GET, serializer_class.Meta.fields)
+
+    async def get(self, request, pk=None):
+        if pk is None:
+            entry = listing_cache_entry(request.GET)
+        elif cache_enabled() and self.get_fieldset(request, self.detail_serializer_class).is_default:
+            entry = (PRODUCT, str(pk))
+        else:
+            entry = None
+        if entry is None:
+            response = await super().get(request, pk)
+        else:
+            data = await sync_to_async(get_or_build)(*entry)
+            if data is None:
+                return self.render({'detail': 'Not found.'}, status=404)
+            response = self.render(data)
+        if pk is not None and response.status_code == 200:
+            # Счётчик в памяти процесса, без записи в базу на каждый просмотр.
+            # Ключ — каноническая запись UUID, а не строка из URL (регистр, без дефисов)
+            record_view(uuid.UUID(str(pk)))
+        return response
+
+
+class StockStreamView(ThrottledAsyncView):
+    """
+    Server-Sent Events with stock and price changes of the subscribed products:
+    GET /api/stock/stream/?products=<uuid>,<uuid>
+
+    The first ``snapshot`` event carries the current sizes, then ``stock``
+    events carry coalesced changes. ``resync`` means the buffer overflowed and
+    the client should refetch the products.
+
+    Connections are throttled like the catalog, and a process serves at most
+    ``STOCK_EVENTS_MAX_STREAMS`` streams at once; extra ones get 503.
+    """
+    # Открытые потоки процесса; меняются только в цикле событий сервера, как и подписки
+    open_streams = 0
+
+    async def get(self, request):
+        try:
+            product_ids = {
+                str(uuid.UUID(value.strip()))
+                for param in request.GET.getlist('products') for value in param.split(',') if value.strip()
+            }
+        except ValueError:
+            return self.render({'detail': 'Invalid product id.'}, status=400)
+        max_products = getattr(settings, 'STOCK_EVENTS_MAX_PRODUCTS', 50)
+        if not product_ids or len(product_ids) > max_products:
+            return self.render(
+                {'detail': f'Pass from 1 to {max_products} product ids.'},
+                status=400
+            )
+
+        if StockStreamView.open_streams >= getattr(settings, 'STOCK_EVENTS_MAX_STREAMS', 500):
+            # Каждый поток держит соединение и подписку, лишние клиенты приходят позже
+            response = self.render({'detail': 'Too many open streams.'}, status=503)
+            response['Retry-After'] = str(max(getattr(settings, 'STOCK_EVENTS_RETRY_MS', 3000) // 1000, 1))
+            return response
+        # Место занимается сразу, освобождается при завершении потока
+        StockStreamView.open_streams += 1
+        response = StreamingHttpResponse(self.stream(product_ids), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # nginx не должен буферизовать поток
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def snapshot(self, product_ids):
+        return [
+            {
+                'product_id': str(row['model__product_id']),
+                'model_id': str(row['model_id']),
+                'sku': row['model__sku'],
+                'size': row['size'],
+                'price': row['price'],
+                'stock': row['stock'],
+            }
+            async for row in ModelSize.objects.filter(
+                model__product_id__in=product_ids,
+                model__is_active=True
+            ).values('model__product_id', 'model_id', 'model__sku', 'size', 'price', 'stock')
+        ]
+
+    async def stream(self, product_ids):
+        # Подписываемся до снимка, чтобы не пропустить изменения между ними
+        subscription = broadcaster.subscribe(product_ids)
+        heartbeat = getattr(settings, 'STOCK_EVENTS_HEARTBEAT_SECONDS', 15)
+        coalesce = getattr(settings, 'STOCK_EVENTS_COALESCE_SECONDS', 0.25)
+        # Django 4.2 не сообщает потоковому ответу об отключении клиента, а сервер молча
+        # отбрасывает запись в закрытое соединение. Поток живёт ограниченное время, живой
+        # клиент переподключается сам через retry и получает свежий snapshot
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + getattr(settings, 'STOCK_EVENTS_MAX_STREAM_SECONDS', 300)
+        try:
+            yield f"retry: {getattr(settings, 'STOCK_EVENTS_RETRY_MS', 3000)}\n\n"
+            yield format_sse('snapshot', await self.snapshot(product_ids))
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(subscription.ready.wait(), timeout=min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    # Комментарий держит соединение через прокси и обнаруживает отключившихся клиентов
+                    yield ': ping\n\n'
+                    continue
+                # Даём пачке изменений собраться в один буфер
+                await asyncio.sleep(coalesce)
+                events, overflowed = subscription.drain()
+                if overflowed:
+                    yield format_sse('resync', {})
+                elif events:
+                    yield format_sse('stock', events)
+        finally:
+            broadcaster.unsubscribe(subscription)
+            StockStreamView.open_streams -= 1
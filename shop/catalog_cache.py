@@ -0,0 +1,259 @@
+# catalog_cache.py
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import QueryDict
+
+from .models import Brand, Category, Product, ProductCategory
+from .singleflight import flight
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'shop:api'
+
+# Виды закешированных ответов API
+PRODUCT = 'product'  # карточка товара, значение — id
+CATEGORY_LISTING = 'category'  # /api/products/?category=<slug>
+BRAND_LISTING = 'brand'  # /api/products/?brand=<slug>
+LISTING_KINDS = (CATEGORY_LISTING, BRAND_LISTING)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# Кеши в памяти процесса: прогрев видит только процесс, изменивший каталог
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_enabled():
+    # С локальным кешем остальные воркеры отдавали бы старые цены и остатки до истечения TTL,
+    # поэтому кеш ответов работает только с общим backend (DJANGO_CACHE_URL)
+    if not _setting('CATALOG_CACHE_ENABLED', True):
+        return False
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def cache_key(kind, value):
+    return f'{CACHE_PREFIX}:{kind}:{value}'
+
+
+def build_product_detail(product_id):
+    from .serializers import ProductDetailSerializer
+    from .views import product_prefetches
+
+    product = Product.objects.filter(pk=product_id, is_active=True).prefetch_related(*product_prefetches()).first()
+    return ProductDetailSerializer(product).data if product else None
+
+
+def build_product_listing(kind, slug):
+    from .serializers import ProductListSerializer
+    from .views import filter_products, product_prefetches
+
+    # Неизвестный slug даёт пустой список, как и без кеша
+    query_params = QueryDict(mutable=True)
+    query_params[kind] = slug
+    queryset = filter_products(Product.objects.filter(is_active=True), query_params)
+    return ProductListSerializer(queryset.prefetch_related(*product_prefetches()), many=True).data
+
+
+def build_entry(kind, value):
+    if kind == PRODUCT:
+        return build_product_detail(value)
+    return build_product_listing(kind, value)
+
+
+def listing_cache_entry(query_params):
+    """Запись кеша для списка товаров или None, если запрос не кешируется"""
+    if not cache_enabled() or len(query_params) != 1:
+        return None
+    kind = next(iter(query_params))
+    values = query_params.getlist(kind)
+    if kind not in LISTING_KINDS or len(values) != 1 or not values[0]:
+        return None
+    return kind, values[0]
+
+
+def get_or_build(kind, value):
+    """
+    Cached API data for an entry; built and stored on a miss.
+
+    Returns:
+        Serialized data or None if the object doesn't exist.
+    """
+    key = cache_key(kind, value)
+    data = cache.get(key)
+    if data is None:
+        # Одновременные промахи по одной записи строят её один раз
+        data = flight.do(key, lambda: _build_and_store(key, kind, value))
+    return data
+
+
+def _build_and_store(key, kind, value):
+    data = build_entry(kind, value)
+    if data is not None:
+        cache.set(key, data, _setting('CATALOG_CACHE_TIMEOUT', 600))
+    return data
+
+
+def get_or_build_products(product_ids):
+    """
+    Cached product cards for many ids; misses are built together with one
+    query per relation.
+
+    Returns:
+        dict: id string -> serialized card, only for existing active products.
+    """
+    from .serializers import ProductDetailSerializer
+    from .views import product_prefetches
+
+    keys = {cache_key(PRODUCT, product_id): product_id for product_id in product_ids}
+    cached = cache.get_many(keys)
+    result = {keys[key]: data for key, data in cached.items()}
+
+    missing = [product_id for key, product_id in keys.items() if key not in cached]
+    if missing:
+        products = Product.objects.filter(pk__in=missing, is_active=True).prefetch_related(*product_prefetches())
+        built = {str(product.pk): ProductDetailSerializer(product).data for product in products}
+        cache.set_many(
+            {cache_key(PRODUCT, product_id): data for product_id, data in built.items()},
+            _setting('CATALOG_CACHE_TIMEOUT', 600)
+        )
+        result.update(built)
+    return result
+
+
+def warm_entries(entries):
+    """Перестраивает записи кеша; удалённые товары убираются из кеша"""
+    timeout = _setting('CATALOG_CACHE_TIMEOUT', 600)
+    for kind, value in entries:
+        data = build_entry(kind, value)
+        if data is None:
+            cache.delete(cache_key(kind, value))
+        else:
+            cache.set(cache_key(kind, value), data, timeout)
+
+
+def affected_entries(product_ids=(), category_ids=(), brand_ids=()):
+    """
+    Cache entries that show the given products, categories and brands.
+
+    A product appears in its own card, in the listings of its categories and
+    their ancestors (the category filter includes descendants) and in its
+    brand listing. Category slugs and brand data are embedded in product cards,
+    so categories and brands expand to their products.
+    """
+    product_ids = set(product_ids)
+    category_ids = set(category_ids)
+    brand_ids = set(brand_ids)
+
+    if brand_ids:
+        product_ids |= set(Product.objects.filter(brand_id__in=brand_ids).values_list('id', flat=True))
+    if category_ids:
+        product_ids |= set(ProductCategory.objects.filter(
+            category_id__in=category_ids
+        ).values_list('product_id', flat=True))
+        product_ids |= set(Product.categories.through.objects.filter(
+            category_id__in=category_ids
+        ).values_list('product_id', flat=True))
+
+    if product_ids:
+        category_ids |= set(ProductCategory.objects.filter(
+            product_id__in=product_ids
+        ).values_list('category_id', flat=True))
+        category_ids |= set(Product.categories.through.objects.filter(
+            product_id__in=product_ids
+        ).values_list('category_id', flat=True))
+        brand_ids |= set(Product.objects.filter(
+            pk__in=product_ids,
+            brand__isnull=False
+        ).values_list('brand_id', flat=True))
+
+    entries = {(PRODUCT, str(product_id)) for product_id in product_ids}
+    if category_ids:
+        categories = Category.objects.filter(pk__in=category_ids).get_ancestors(include_self=True)
+        entries |= {(CATEGORY_LISTING, slug) for slug in categories.values_list('slug', flat=True)}
+    if brand_ids:
+        entries |= {
+            (BRAND_LISTING, slug) for slug in Brand.objects.filter(pk__in=brand_ids).values_list('slug', flat=True)
+        }
+    return entries
+
+
+class CacheWarmer:
+    """
+    Coalesces catalog changes and re-warms the affected cache entries in a
+    background thread ``delay`` seconds after the first change.
+
+    Entries are overwritten in place rather than deleted, so readers never hit
+    a cold miss: for up to ``delay`` seconds they still get the previous data.
+    Changes made during a pass are handled by the next pass of the same thread.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._timer = None
+        self._running = False
+        self._reset_pending()
+
+    def _reset_pending(self):
+        self._product_ids = set()
+        self._category_ids = set()
+        self._brand_ids = set()
+        self._entries = set()
+
+    def add(self, product_ids=(), category_ids=(), brand_ids=(), entries=()):
+        with self._lock:
+            self._product_ids.update(product_ids)
+            self._category_ids.update(category_ids)
+            self._brand_ids.update(brand_ids)
+            self._entries.update(entries)
+            if self._running or self._timer is not None:
+                return
+            self._timer = threading.Timer(self.delay, self._run)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._timer = None
+                pending = (self._product_ids, self._category_ids, self._brand_ids, self._entries)
+                self._reset_pending()
+                self._running = any(pending)
+                if not self._running:
+                    return
+            product_ids, category_ids, brand_ids, entries = pending
+            try:
+                warm_entries(entries | affected_entries(product_ids, category_ids, brand_ids))
+            except Exception:
+                logger.exception("Error warming catalog cache")
+            finally:
+                connection.close()
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def get_warmer():
+    global _warmer
+    with _warmer_lock:
+        if _warmer is None:
+            _warmer = CacheWarmer(_setting('CATALOG_CACHE_WARM_DELAY', 1))
+        return _warmer
+
+
+def schedule_cache_warm(product_ids=(), category_ids=(), brand_ids=(), entries=()):
+    """Планирует прогрев затронутых записей кеша после фиксации транзакции"""
+    if not cache_enabled():
+        return
+    changes = (set(product_ids), set(category_ids), set(brand_ids), set(entries))
+    transaction.on_commit(lambda: get_warmer().add(*changes))
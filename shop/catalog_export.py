@@ -0,0 +1,149 @@
+# catalog_export.py
+import csv
+import io
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .models import Product, ProductModel
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+EXPORT_CHUNK_SIZE = 500
+# Размер блока, которым поток отдаётся клиенту
+STREAM_BLOCK_SIZE = 64 * 1024
+
+CSV_COLUMNS = (
+    'product_id', 'product_slug', 'title', 'brand', 'categories', 'base_price',
+    'sku', 'color', 'size', 'price', 'stock', 'image_url',
+)
+
+
+def iter_export_products(chunk_size=EXPORT_CHUNK_SIZE):
+    """Итерирует активные товары серверным курсором; связи предзагружаются по чанкам"""
+    return Product.objects.filter(is_active=True).select_related('brand').prefetch_related(
+        Prefetch('models', queryset=ProductModel.objects.filter(is_active=True).prefetch_related(
+            'sizes',
+            'images'
+        )),
+        'categories',
+    ).order_by('pk').iterator(chunk_size=chunk_size)
+
+
+def _file_url(file, base_url):
+    if not file:
+        return None
+    return f"{base_url}{file.url}" if base_url else file.url
+
+
+def product_record(product, base_url=''):
+    return {
+        'id': product.id,
+        'slug': product.slug,
+        'title': product.title,
+        'brand': product.brand.name if product.brand else None,
+        'categories': [category.slug for category in product.categories.all()],
+        'base_price': product.base_price,
+        'image_url': _file_url(product.image, base_url),
+        'models': [
+            {
+                'sku': product_model.sku,
+                'color': product_model.color,
+                'images': [_file_url(image.image, base_url) for image in product_model.images.all()],
+                'sizes': [
+                    {'size': size.size, 'price': size.price, 'stock': size.stock}
+                    for size in product_model.sizes.all()
+                ],
+            }
+            for product_model in product.models.all()
+        ],
+    }
+
+
+def iter_jsonl(products, base_url=''):
+    for product in products:
+        yield json.dumps(product_record(product, base_url), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def iter_csv(products, base_url=''):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    writer.writerow(CSV_COLUMNS)
+    yield flush()
+    for product in products:
+        categories = '|'.join(category.slug for category in product.categories.all())
+        brand = product.brand.name if product.brand else ''
+        for product_model in product.models.all():
+            images = list(product_model.images.all())
+            main_image = next((image for image in images if image.is_main), None) or next(iter(images), None)
+            image_url = _file_url(main_image.image if main_image else product.image, base_url) or ''
+            for size in product_model.sizes.all():
+                writer.writerow((
+                    product.id, product.slug, product.title, brand, categories, product.base_price,
+                    product_model.sku, product_model.color, size.size, size.price, size.stock, image_url,
+                ))
+        yield flush()
+
+
+def iter_blocks(chunks, block_size=STREAM_BLOCK_SIZE):
+    """Склеивает мелкие строки в блоки байтов, чтобы не отправлять их по одной"""
+    block = []
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        block.append(data)
+        size += len(data)
+        if size >= block_size:
+            yield b''.join(block)
+            block = []
+            size = 0
+    if block:
+        yield b''.join(block)
+
+
+def iter_gzip(blocks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 — формат gzip
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_catalog(export_format='jsonl', base_url='', compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Streams the catalog as JSON Lines or CSV bytes.
+
+    Memory use stays constant: products are read with a server-side cursor in
+    chunks of ``chunk_size`` and every block is yielded as soon as it is ready.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+    products = iter_export_products(chunk_size)
+    lines = iter_jsonl(products, base_url) if export_format == 'jsonl' else iter_csv(products, base_url)
+    blocks = iter_blocks(lines)
+    return iter_gzip(blocks) if compress else blocks
+
+
+async def aiter_sync(iterator):
+    """
+    Wraps a sync iterator for ASGI streaming without buffering it whole.
+
+    Every step runs in the same thread, so the server-side cursor stays valid.
+    """
+    sentinel = object()
+    next_block = sync_to_async(next, thread_sensitive=True)
+    while True:
+        block = await next_block(iterator, sentinel)
+        if block is sentinel:
+            break
+        yield block
@@ -0,0 +1,233 @@
+# catalog_import.py
+import csv
+import io
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .catalog_cache import schedule_cache_warm
+from .catalog_snapshot import schedule_snapshot_rebuild
+from .models import ProductModel, ModelSize
+from .orders import bump_catalog_version
+from .size_summary import refresh_size_summaries
+from .stock_events import publish_stock_changes, stock_event
+
+REQUIRED_COLUMNS = ('sku', 'size')
+DEFAULT_BATCH_SIZE = 2000
+# Предел PositiveIntegerField
+MAX_STOCK = 2147483647
+# Сколько строк изменений хранить в отчёте
+MAX_REPORT_CHANGES = 200
+
+
+class ImportReport:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        self.changes = []
+
+    def add_change(self, sku, size, field, old, new):
+        if len(self.changes) < MAX_REPORT_CHANGES:
+            self.changes.append((sku, size, field, old, new))
+
+    def summary(self):
+        prefix = 'Пробный запуск: ' if self.dry_run else ''
+        return (
+            f"{prefix}строк {self.rows}, создано {self.created}, обновлено {self.updated}, "
+            f"без изменений {self.unchanged}, ошибок {len(self.errors)}"
+        )
+
+
+def iter_csv_rows(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    for row in csv.DictReader(text):
+        yield {(key or '').strip().lower(): value for key, value in row.items()}
+
+
+def iter_xlsx_rows(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Для импорта XLSX установите openpyxl: pip install openpyxl")
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell or '').strip().lower() for cell in next(rows, ())]
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def iter_rows(file, filename):
+    """Потоково читает строки файла в зависимости от расширения"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.xlsx':
+        return iter_xlsx_rows(file)
+    if extension == '.csv':
+        return iter_csv_rows(file)
+    raise ValueError(f"Неподдерживаемый формат файла: {extension}")
+
+
+def _fits_field(value, field_name):
+    # Значение должно помещаться в DecimalField модели, иначе запись упадёт с DataError
+    field = ModelSize._meta.get_field(field_name)
+    return abs(value) < Decimal(10) ** (field.max_digits - field.decimal_places)
+
+
+def _parse_row(row):
+    missing = [column for column in REQUIRED_COLUMNS if row.get(column) in (None, '')]
+    if missing:
+        raise ValueError(f"нет значения в колонках {', '.join(missing)}")
+
+    sku = str(row['sku']).strip()
+    try:
+        size = Decimal(str(row['size']).replace(',', '.')).quantize(Decimal('0.1'))
+        price = row.get('price')
+        price = None if price in (None, '') else Decimal(str(price).replace(',', '.')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError("некорректный размер или цена")
+    if not size.is_finite() or size <= 0 or not _fits_field(size, 'size'):
+        raise ValueError("некорректный размер")
+    if price is not None and (not price.is_finite() or price < 0 or not _fits_field(price, 'price')):
+        raise ValueError("некорректная цена")
+
+    stock = row.get('stock')
+    if stock in (None, ''):
+        stock = None
+    else:
+        try:
+            stock = Decimal(str(stock).strip().replace(',', '.'))
+        except InvalidOperation:
+            raise ValueError("некорректный остаток")
+        # "inf", "nan" и дробные значения — ошибка строки, а не OverflowError или округление
+        if not stock.is_finite() or stock != stock.to_integral_value():
+            raise ValueError("некорректный остаток")
+        stock = int(stock)
+        if stock < 0:
+            raise ValueError("остаток не может быть отрицательным")
+        if stock > MAX_STOCK:
+            raise ValueError("слишком большой остаток")
+
+    return sku, size, price, stock
+
+
+def _apply_batch(batch, report, pending):
+    skus = {sku for _, (sku, _, _, _) in batch}
+    model_ids = dict(ProductModel.objects.filter(sku__in=skus).values_list('sku', 'id'))
+    existing = {
+        (model_size.model_id, model_size.size): model_size
+        for model_size in ModelSize.objects.filter(model_id__in=model_ids.values())
+    }
+    # Пробный запуск ничего не пишет: изменения прошлых пакетов берём из памяти,
+    # чтобы повтор размера в следующем пакете не считался новым второй раз
+    batch_model_ids = set(model_ids.values())
+    existing.update((key, model_size) for key, model_size in pending.items() if key[0] in batch_model_ids)
+
+    to_create = {}
+    to_update = {}
+    for line_number, (sku, size, price, stock) in batch:
+        model_id = model_ids.get(sku)
+        if model_id is None:
+            report.errors.append((line_number, f"артикул {sku} не найден"))
+            continue
+
+        key = (model_id, size)
+        model_size = existing.get(key) or to_create.get(key)
+        if model_size is None:
+            if price is None:
+                # Новый размер без цены попал бы в продажу по 0.00
+                report.errors.append((line_number, f"артикул {sku}, размер {size}: для нового размера нужна цена"))
+                continue
+            model_size = ModelSize(model_id=model_id, size=size, price=price, stock=stock or 0)
+            to_create[key] = model_size
+            report.add_change(sku, size, 'new', None, f"{model_size.price} / {model_size.stock}")
+            continue
+
+        changed = False
+        if price is not None and model_size.price != price:
+            report.add_change(sku, size, 'price', model_size.price, price)
+            model_size.price = price
+            changed = True
+        if stock is not None and model_size.stock != stock:
+            report.add_change(sku, size, 'stock', model_size.stock, stock)
+            model_size.stock = stock
+            changed = True
+
+        if changed and key not in to_create:
+            to_update[key] = model_size
+        elif not changed:
+            report.unchanged += 1
+
+    report.created += len(to_create)
+    report.updated += len(to_update)
+    if report.dry_run:
+        pending.update(to_create)
+        pending.update(to_update)
+        return
+
+    with transaction.atomic():
+        if to_create:
+            ModelSize.objects.bulk_create(to_create.values(), batch_size=len(to_create))
+        if to_update:
+            ModelSize.objects.bulk_update(to_update.values(), ['price', 'stock'], batch_size=len(to_update))
+        # bulk-операции не отправляют post_save, обновляем сводки размеров вручную
+        changed_model_ids = {model_id for model_id, _ in to_create} | {model_id for model_id, _ in to_update}
+        if changed_model_ids:
+            product_of = dict(ProductModel.objects.filter(pk__in=changed_model_ids).values_list('id', 'product_id'))
+            product_ids = set(product_of.values())
+            refresh_size_summaries(product_ids)
+            # Все изменения импорта прогреваются одним проходом
+            schedule_cache_warm(product_ids=product_ids)
+
+            sku_of = {model_id: sku for sku, model_id in model_ids.items()}
+            events = [
+                stock_event(model_size, product_of[model_size.model_id], sku_of[model_size.model_id])
+                for model_size in list(to_create.values()) + list(to_update.values())
+            ]
+            transaction.on_commit(lambda: publish_stock_changes(events))
+
+
+def import_stock(rows, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Applies size/price/stock rows to ModelSize in batched upserts.
+
+    Args:
+        rows: Iterable of dicts with sku, size and optional price, stock columns.
+        batch_size (int): Rows resolved and written per transaction.
+        dry_run (bool): Only build the diff report, don't write anything.
+
+    Returns:
+        ImportReport: Counters, row errors and the first changes.
+    """
+    report = ImportReport(dry_run=dry_run)
+    pending = {}
+    batch = []
+    # Строка 1 — заголовок
+    for line_number, row in enumerate(rows, start=2):
+        report.rows += 1
+        try:
+            batch.append((line_number, _parse_row(row)))
+        except ValueError as e:
+            report.errors.append((line_number, str(e)))
+            continue
+
+        if len(batch) >= batch_size:
+            _apply_batch(batch, report, pending)
+            batch = []
+
+    if batch:
+        _apply_batch(batch, report, pending)
+    report.errors.sort()
+
+    if not dry_run and (report.created or report.updated):
+        # bulk-операции не отправляют post_save, сбрасываем кеши каталога явно
+        bump_catalog_version()
+        schedule_snapshot_rebuild()
+    return report
@@ -0,0 +1,226 @@
+# catalog_snapshot.py
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Prefetch
+
+from .compression import brotli
+from .image_pipeline import variant_url
+from .models import Brand, Category, ModelImage, Product, ProductModel
+from .size_summary import price_decimal
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = 'catalog'
+# Указатель на актуальную версию: маленький файл без долгого кеширования
+LATEST_FILENAME = f'{SNAPSHOT_PREFIX}.latest.json'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def snapshot_dir():
+    return _setting('CATALOG_SNAPSHOT_DIR', os.path.join(settings.MEDIA_ROOT, 'catalog'))
+
+
+def snapshot_url(filename):
+    return _setting('CATALOG_SNAPSHOT_URL', f"{settings.MEDIA_URL}catalog/") + filename
+
+
+def _file_url(file):
+    if not file:
+        return None
+    # Миниатюра из фонового конвейера обработки изображений, если она уже готова
+    url = variant_url(file, _setting('IMAGE_THUMBNAIL_WIDTH', 320))
+    return _setting('CATALOG_SNAPSHOT_BASE_URL', '') + url
+
+
+def _product_card(product):
+    images = [image for product_model in product.models.all() for image in product_model.images.all()]
+    main_image = next((image for image in images if image.is_main), None) or next(iter(images), None)
+
+    sizes = [summary for summary in product.size_summary if summary['stock'] > 0]
+
+    return {
+        'id': product.id,
+        'slug': product.slug,
+        'title': product.title,
+        'brand': product.brand.slug if product.brand else None,
+        'categories': [category.slug for category in product.categories.all()],
+        'base_price': product.base_price,
+        'min_price': min((price_decimal(summary['price']) for summary in sizes), default=None),
+        'thumbnail': _file_url(product.image or (main_image.image if main_image else None)),
+        'available_sizes': sizes,
+    }
+
+
+def build_snapshot_data():
+    """Собирает данные витрины: дерево категорий, бренды и карточки товаров"""
+    categories = [
+        {
+            'id': category.id,
+            'name': category.name,
+            'slug': category.slug,
+            'parent_id': category.parent_id,
+            'level': category.level,
+            'image': _file_url(category.image),
+        }
+        for category in Category.objects.filter(is_active=True).order_by('tree_id', 'lft')
+    ]
+    brands = [
+        {'id': brand.id, 'name': brand.name, 'slug': brand.slug, 'logo': _file_url(brand.logo)}
+        for brand in Brand.objects.filter(is_active=True).order_by('name')
+    ]
+    products = Product.objects.filter(is_active=True).select_related('brand').prefetch_related(
+        Prefetch('models', queryset=ProductModel.objects.filter(is_active=True).prefetch_related(
+            Prefetch('images', queryset=ModelImage.objects.only('id', 'model_id', 'image', 'is_main', 'order_index')),
+        )),
+        'categories',
+    ).order_by('-created_at').iterator(chunk_size=500)
+
+    return {
+        'categories': categories,
+        'brands': brands,
+        'products': [_product_card(product) for product in products],
+    }
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _cleanup_old_versions(directory, keep):
+    snapshots = sorted(
+        (
+            entry for entry in os.scandir(directory)
+            if entry.name.startswith(f'{SNAPSHOT_PREFIX}.') and entry.name.endswith('.json')
+            and entry.name != LATEST_FILENAME
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in snapshots[keep:]:
+        for path in (entry.path, f'{entry.path}.gz', f'{entry.path}.br'):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def write_snapshot():
+    """
+    Renders the browse catalog into a versioned JSON file plus precompressed
+    gzip (and brotli, if installed) copies.
+
+    The version is a hash of the content, so the file can be cached forever;
+    catalog.latest.json points to the current version. All files are written
+    atomically (temp file + rename).
+
+    Returns:
+        dict: Contents of the pointer file.
+    """
+    data = build_snapshot_data()
+    body = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    version = hashlib.sha1(body).hexdigest()[:12]
+    filename = f'{SNAPSHOT_PREFIX}.{version}.json'
+
+    directory = snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    if os.path.exists(path):
+        # Каталог вернулся к прежней версии: обновляем время, чтобы её не удалила очистка
+        os.utime(path)
+    else:
+        _write_atomic(f'{path}.gz', gzip.compress(body, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write_atomic(f'{path}.br', brotli.compress(body, quality=11))
+        _write_atomic(path, body)
+
+    latest = {
+        'version': version,
+        'url': snapshot_url(filename),
+        'gzip_url': snapshot_url(f'{filename}.gz'),
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'products': len(data['products']),
+    }
+    _write_atomic(os.path.join(directory, LATEST_FILENAME), json.dumps(latest).encode('utf-8'))
+    _cleanup_old_versions(directory, _setting('CATALOG_SNAPSHOT_KEEP_VERSIONS', 3))
+    return latest
+
+
+class SnapshotScheduler:
+    """
+    Debounces snapshot rebuilds: a burst of catalog edits triggers one rebuild
+    ``delay`` seconds after the first edit; edits made during a rebuild schedule
+    one more.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._timer = None
+        self._running = False
+        self._dirty = False
+
+    def schedule(self):
+        with self._lock:
+            if self._running:
+                self._dirty = True
+                return
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.delay, self._run)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run(self):
+        with self._lock:
+            self._timer = None
+            self._running = True
+            self._dirty = False
+        try:
+            write_snapshot()
+        except Exception:
+            logger.exception("Error building catalog snapshot")
+        finally:
+            connection.close()
+            with self._lock:
+                self._running = False
+                dirty = self._dirty
+        if dirty:
+            self.schedule()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def schedule_snapshot_rebuild():
+    """Планирует пересборку снимка после фиксации текущей транзакции"""
+    global _scheduler
+    if not _setting('CATALOG_SNAPSHOT_AUTO_REBUILD', True):
+        return
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SnapshotScheduler(_setting('CATALOG_SNAPSHOT_DEBOUNCE_SECONDS', 5))
+    transaction.on_commit(_scheduler.schedule)
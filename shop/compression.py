@@ -0,0 +1,160 @@
+# compression.py
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него ответы сжимаются только gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'image/svg+xml',
+    'text/',
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def parse_accept_encoding(header):
+    """Accept-Encoding -> {кодировка: q}"""
+    encodings = {}
+    for part in header.split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[name] = quality
+    return encodings
+
+
+def choose_encoding(header, available=None):
+    """
+    Best encoding the client accepts: the highest q wins, brotli on ties.
+
+    Returns:
+        str: 'br', 'gzip' or None.
+    """
+    if available is None:
+        available = ('br', 'gzip') if brotli is not None else ('gzip',)
+    accepted = parse_accept_encoding(header or '')
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=_setting('COMPRESSION_BROTLI_QUALITY', 5))
+    return gzip.compress(data, compresslevel=_setting('COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+
+
+class CompressedBodyCache:
+    """
+    LRU of compressed bodies keyed by content hash and encoding.
+
+    Catalog GET responses repeat byte for byte between requests, so each
+    variant is compressed once and then only hashed.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, data, encoding):
+        key = (hashlib.sha1(data).digest(), encoding)
+        with self._lock:
+            compressed = self._items.get(key)
+            if compressed is not None:
+                self._items.move_to_end(key)
+                return compressed
+
+        compressed = compress(data, encoding)
+        if len(compressed) > self.max_bytes:
+            return compressed
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = compressed
+                self._size += len(compressed)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+        return compressed
+
+
+_body_cache = None
+_body_cache_lock = threading.Lock()
+
+
+def get_body_cache():
+    global _body_cache
+    with _body_cache_lock:
+        if _body_cache is None:
+            _body_cache = CompressedBodyCache(_setting('COMPRESSION_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+        return _body_cache
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Content-negotiated brotli/gzip compression of API responses.
+
+    Streaming responses (exports, SSE) are left untouched, as are bodies below
+    COMPRESSION_MIN_SIZE and non-text content types.
+    """
+
+    def process_response(self, request, response):
+        if not _setting('COMPRESSION_ENABLED', True):
+            return response
+        if not request.path.startswith(tuple(_setting('COMPRESSION_PATH_PREFIXES', ('/api/',)))):
+            return response
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < _setting('COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+
+        if request.method == 'GET' and response.status_code == 200:
+            compressed = get_body_cache().get_or_compress(response.content, encoding)
+        else:
+            compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # Сжатое тело отличается побайтно, ETag становится слабым (как в GZipMiddleware)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,112 @@
+# base.py
+import threading
+import time
+
+from django.db.backends.postgresql import base
+
+
+class ConnectionMetrics:
+    """
+    Per-process counters for persistent database connections.
+
+    ``opened + reused`` counts requests served by a connection (new or reused),
+    ``connect_ms`` is the latency of opening a new connection. There is no pool
+    to wait for: each thread owns its persistent connection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.opened = 0
+            self.reused = 0
+            self.closed = 0
+            self.health_check_failures = 0
+            self.open_connections = 0
+            self.peak_open_connections = 0
+            self.connect_ms_total = 0.0
+            self.connect_ms_max = 0.0
+
+    def connection_opened(self, connect_ms):
+        with self._lock:
+            self.opened += 1
+            self.open_connections += 1
+            self.peak_open_connections = max(self.peak_open_connections, self.open_connections)
+            self.connect_ms_total += connect_ms
+            self.connect_ms_max = max(self.connect_ms_max, connect_ms)
+
+    def connection_reused(self):
+        with self._lock:
+            self.reused += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self.closed += 1
+            self.open_connections = max(self.open_connections - 1, 0)
+
+    def health_check_failed(self):
+        with self._lock:
+            self.health_check_failures += 1
+
+    def snapshot(self, max_connections=None):
+        with self._lock:
+            served = self.opened + self.reused
+            data = {
+                'opened': self.opened,
+                'reused': self.reused,
+                'closed': self.closed,
+                'health_check_failures': self.health_check_failures,
+                'open_connections': self.open_connections,
+                'peak_open_connections': self.peak_open_connections,
+                'reuse_ratio': round(self.reused / served, 3) if served else None,
+                'connect_ms_avg': round(self.connect_ms_total / self.opened, 2) if self.opened else None,
+                'connect_ms_max': round(self.connect_ms_max, 2),
+            }
+        if max_connections:
+            # Доля ожидаемых соединений процесса (по числу потоков воркера), которые сейчас открыты
+            data['max_connections'] = max_connections
+            data['open_connections_ratio'] = round(data['open_connections'] / max_connections, 3)
+        return data
+
+
+metrics = ConnectionMetrics()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend that records connection reuse and connect latency."""
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        metrics.connection_opened((time.perf_counter() - started) * 1000)
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            metrics.connection_closed()
+
+    def close_if_health_check_failed(self):
+        checking = (
+            self.connection is not None
+            and self.health_check_enabled
+            and not self.health_check_done
+        )
+        super().close_if_health_check_failed()
+        if checking and self.connection is None:
+            metrics.health_check_failed()
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого HTTP-запроса
+        super().close_if_unusable_or_obsolete()
+        self._request_counted = False
+
+    def _cursor(self, name=None):
+        # Первый курсор запроса на уже открытом соединении считаем переиспользованием
+        if not getattr(self, '_request_counted', False):
+            self._request_counted = True
+            if self.connection is not None:
+                metrics.connection_reused()
+        return super()._cursor(name)
@@ -0,0 +1,122 @@
+# db_router.py
+import contextvars
+import itertools
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections, DatabaseError
+from django.utils.decorators import sync_and_async_middleware
+
+# Состояние маршрутизации текущего запроса: None — все чтения на основную базу, иначе
+# {'replica': alias} с репликой, выбранной при первом чтении. Словарь изменяемый: потоки
+# sync_to_async под ASGI работают с копией контекста, но с тем же объектом
+_request_routing = contextvars.ContextVar('request_routing', default=None)
+
+PRIMARY_PIN_COOKIE = 'db_pin_primary'
+# WebApp Telegram ходит в API с другого сайта без cookies: клиент повторяет этот заголовок,
+# пока не истечёт срок из ответа на запись
+PRIMARY_PIN_HEADER = 'X-DB-Pin-Primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReadReplicaRouter:
+    """
+    Routes reads of catalog API requests to replicas.
+
+    A request picks a replica round-robin on its first read and keeps it for
+    the rest of its queries, so one response never mixes replicas with
+    different lag. Everything else (writes, admin, requests pinned to primary after a write)
+    uses ``default``. A replica that fails to connect is skipped for
+    ``DATABASE_REPLICA_RETRY_SECONDS``.
+    """
+
+    def __init__(self):
+        self.replicas = list(getattr(settings, 'DATABASE_REPLICAS', []))
+        self.retry_seconds = getattr(settings, 'DATABASE_REPLICA_RETRY_SECONDS', 30)
+        self._cycle = itertools.cycle(self.replicas)
+        self._down_until = {}
+        self._lock = threading.Lock()
+
+    def _next_replica(self):
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                alias = next(self._cycle)
+                if self._down_until.get(alias, 0) > now:
+                    continue
+            try:
+                connections[alias].ensure_connection()
+            except DatabaseError:
+                with self._lock:
+                    self._down_until[alias] = now + self.retry_seconds
+                continue
+            return alias
+        return None
+
+    def db_for_read(self, model, **hints):
+        routing = _request_routing.get()
+        if not self.replicas or routing is None:
+            return 'default'
+        if routing['replica'] is None:
+            routing['replica'] = self._next_replica() or 'default'
+        return routing['replica']
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def _begin(request):
+    use_replica = (
+        request.method in SAFE_METHODS
+        and request.path.startswith('/api/')
+        and PRIMARY_PIN_COOKIE not in request.COOKIES
+        and PRIMARY_PIN_HEADER not in request.headers
+    )
+    return _request_routing.set({'replica': None} if use_replica else None)
+
+
+def _finish(request, response):
+    # После записи клиент читает с основной базы, пока реплики догоняют
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        pin_seconds = getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5)
+        # SameSite=None: иначе браузер не отправит cookie в запросах WebApp с другого сайта
+        response.set_cookie(
+            PRIMARY_PIN_COOKIE,
+            '1',
+            max_age=pin_seconds,
+            httponly=True,
+            secure=True,
+            samesite='None',
+        )
+        response[PRIMARY_PIN_HEADER] = str(pin_seconds)
+    return response
+
+
+@sync_and_async_middleware
+def ReplicaRoutingMiddleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _begin(request)
+            try:
+                response = await get_response(request)
+            finally:
+                _request_routing.reset(token)
+            return _finish(request, response)
+    else:
+        def middleware(request):
+            token = _begin(request)
+            try:
+                response = get_response(request)
+            finally:
+                _request_routing.reset(token)
+            return _finish(request, response)
+    return middleware
@@ -0,0 +1,41 @@
+# fieldsets.py
+
+
+def _split(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class FieldSet:
+    """
+    Fields requested with ?fields=a,b&expand=rel.
+
+    Without ``fields`` the serializer's default fields are returned with all
+    relations nested, as before. With ``fields`` only the listed fields are
+    returned; relations are rendered as ids unless named in ``expand``
+    (which also includes them).
+    """
+
+    def __init__(self, default_fields, fields=None, expand=()):
+        self.default_fields = tuple(default_fields)
+        self.requested = fields
+        self.expand = set(expand)
+
+    @classmethod
+    def from_query_params(cls, query_params, default_fields):
+        return cls(
+            default_fields,
+            fields=_split(query_params.get('fields')) or None,
+            expand=_split(query_params.get('expand'))
+        )
+
+    @property
+    def is_default(self):
+        return self.requested is None
+
+    def wants(self, name):
+        if self.requested is None:
+            return name in self.default_fields
+        return name in self.requested or name in self.expand
+
+    def is_expanded(self, name):
+        return self.requested is None or name in self.expand
@@ -0,0 +1,154 @@
+# image_pipeline.py
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .image_worker import process_image_file, variant_name
+from .models import Brand, Category, ModelImage, ProcessedImage, Product
+
+logger = logging.getLogger(__name__)
+
+# Поля с изображениями, которые обрабатываются после загрузки
+IMAGE_FIELDS = {
+    ModelImage: 'image',
+    Product: 'image',
+    Brand: 'logo',
+    Category: 'image',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: дочерние процессы не наследуют соединения с БД и потоки сервера
+            _executor = ProcessPoolExecutor(
+                max_workers=_setting('IMAGE_PIPELINE_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def variant_path(file, width, variant_format='jpeg'):
+    """Путь к готовому варианту изображения или None, если он ещё не создан"""
+    if not file:
+        return None
+    path = os.path.join(settings.MEDIA_ROOT, variant_name(file.name, width, variant_format))
+    return path if os.path.exists(path) else None
+
+
+def variant_url(file, width, variant_format='webp'):
+    """URL варианта изображения; пока вариант не готов — URL исходного файла"""
+    if not file:
+        return None
+    if variant_path(file, width, variant_format):
+        return f"{settings.MEDIA_URL}{variant_name(file.name, width, variant_format)}"
+    return file.url
+
+
+def image_source_path(file):
+    """Файл для отдачи в API: уменьшенный вариант, если он готов, иначе оригинал"""
+    return variant_path(file, _setting('IMAGE_API_VARIANT_WIDTH', 640)) or file.path
+
+
+def _process_kwargs(file):
+    return {
+        'source_path': file.path,
+        'media_root': settings.MEDIA_ROOT,
+        'original_name': file.name,
+        'widths': _setting('IMAGE_VARIANT_WIDTHS', (160, 320, 640, 1280)),
+        'quality': _setting('IMAGE_VARIANT_QUALITY', 82),
+    }
+
+
+def save_result(original_name, result=None, error=None):
+    if error is not None:
+        ProcessedImage.objects.filter(original=original_name).update(
+            status=ProcessedImage.STATUS_FAILED,
+            error=str(error),
+            processed_at=timezone.now(),
+        )
+        return
+    ProcessedImage.objects.filter(original=original_name).update(
+        status=ProcessedImage.STATUS_READY,
+        error='',
+        processed_at=timezone.now(),
+        **result,
+    )
+
+
+def _on_done(original_name, future):
+    # Выполняется в служебном потоке пула
+    try:
+        error = future.exception()
+        save_result(original_name, None if error else future.result(), error)
+    except Exception:
+        logger.exception("Error saving processed image %s", original_name)
+    finally:
+        connection.close()
+
+
+def _is_newer(file, record):
+    # Файл с тем же именем мог быть загружен заново после обработки
+    try:
+        return os.path.getmtime(file.path) > record.processed_at.timestamp()
+    except (OSError, AttributeError):
+        return True
+
+
+def enqueue_image(file, force=False):
+    """
+    Registers an uploaded image and queues it for processing after commit.
+
+    Files that are already processed are skipped unless ``force`` is set.
+    """
+    if not file or not hasattr(file.storage, 'path'):
+        return None
+    record, created = ProcessedImage.objects.get_or_create(original=file.name)
+    if not created and not force and record.status == ProcessedImage.STATUS_READY and not _is_newer(file, record):
+        return record
+    if not created:
+        ProcessedImage.objects.filter(pk=record.pk).update(status=ProcessedImage.STATUS_PENDING)
+
+    kwargs = _process_kwargs(file)
+
+    def submit():
+        future = get_executor().submit(process_image_file, **kwargs)
+        future.add_done_callback(partial(_on_done, kwargs['original_name']))
+
+    transaction.on_commit(submit)
+    return record
+
+
+def process_image_now(file):
+    """Синхронная обработка (для команды process_images)"""
+    ProcessedImage.objects.get_or_create(original=file.name)
+    try:
+        result = process_image_file(**_process_kwargs(file))
+    except Exception as e:
+        save_result(file.name, error=e)
+        return False
+    save_result(file.name, result)
+    return True
+
+
+def iter_uploaded_images():
+    """Все файлы изображений каталога"""
+    for model, field_name in IMAGE_FIELDS.items():
+        queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        for instance in queryset.only('pk', field_name).iterator():
+            yield getattr(instance, field_name)
@@ -0,0 +1,106 @@
+# image_worker.py
+# Выполняется в дочерних процессах пула: без импорта Django, Pillow загружается лениво
+import hashlib
+import io
+import os
+import tempfile
+
+VARIANTS_DIR = 'variants'
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def variant_name(original_name, width, variant_format):
+    """Детерминированное имя варианта: variants/<имя исходного файла>/w<ширина>.<ext>"""
+    return f"{VARIANTS_DIR}/{original_name}/w{width}.{VARIANT_FORMATS[variant_format][1]}"
+
+
+def difference_hash(image, hash_size=8):
+    """dHash: 64-битный перцептивный хеш по разнице яркости соседних пикселей"""
+    from PIL import Image
+
+    pixels = list(image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(hash_size):
+        for column in range(hash_size):
+            left = pixels[row * (hash_size + 1) + column]
+            right = pixels[row * (hash_size + 1) + column + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def _save_atomic(image, path, pillow_format, **options):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            # Метаданные (EXIF, XMP, ICC) не передаём — они не попадают в вариант
+            image.save(file, pillow_format, **options)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def process_image_file(source_path, media_root, original_name, widths, quality=82):
+    """
+    Builds stripped WebP/JPEG variants of an uploaded image.
+
+    Widths larger than the original are not upscaled: the variant keeps the
+    original size but is still stored under the requested width.
+
+    Returns:
+        dict: width, height, content_hash, perceptual_hash and variants
+        ({format: {width: storage name}}).
+    """
+    from PIL import Image, ImageOps
+
+    with open(source_path, 'rb') as file:
+        data = file.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    width, height = image.size
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    resized = {}
+    variants = {variant_format: {} for variant_format in VARIANT_FORMATS}
+    for target_width in sorted(set(widths)):
+        actual_width = min(target_width, width)
+        if actual_width not in resized:
+            actual_height = max(1, round(height * actual_width / width))
+            resized[actual_width] = (
+                image if actual_width == width else image.resize((actual_width, actual_height), Image.LANCZOS)
+            )
+        variant = resized[actual_width]
+
+        webp_name = variant_name(original_name, target_width, 'webp')
+        _save_atomic(variant, os.path.join(media_root, webp_name), 'WEBP', quality=quality, method=4)
+
+        jpeg_image = variant
+        if has_alpha:
+            # JPEG без прозрачности: кладём изображение на белый фон
+            jpeg_image = Image.new('RGB', variant.size, (255, 255, 255))
+            jpeg_image.paste(variant, mask=variant.getchannel('A'))
+        jpeg_name = variant_name(original_name, target_width, 'jpeg')
+        _save_atomic(jpeg_image, os.path.join(media_root, jpeg_name), 'JPEG',
+                     quality=quality, optimize=True, progressive=True)
+
+        variants['webp'][str(target_width)] = webp_name
+        variants['jpeg'][str(target_width)] = jpeg_name
+
+    return {
+        'width': width,
+        'height': height,
+        'content_hash': content_hash,
+        'perceptual_hash': difference_hash(image),
+        'variants': variants,
+    }
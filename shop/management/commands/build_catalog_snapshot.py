@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from shop.catalog_snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Собрать статический снимок каталога для WebApp"
+
+    def handle(self, *args, **options):
+        latest = write_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Снимок {latest['version']} ({latest['products']} товаров): {latest['url']}"
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop.similarity import refresh_similar_products
+
+
+class Command(BaseCommand):
+    help = "Рассчитать похожие товары (по умолчанию только для изменившихся товаров)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Пересчитать списки всех товаров")
+        parser.add_argument('--count', type=int, default=None, help="Число похожих товаров на товар")
+
+    def handle(self, *args, **options):
+        updated = refresh_similar_products(full=options['full'], count=options['count'])
+        self.stdout.write(self.style.SUCCESS(f"Обновлено списков похожих товаров: {updated}"))
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog_export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_catalog
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка каталога в JSON Lines или CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл для записи, '-' — stdout")
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='jsonl', dest='export_format')
+        parser.add_argument('--gzip', action='store_true', help="Сжать выгрузку gzip")
+        parser.add_argument('--base-url', default='', help="Префикс для URL изображений, например https://shop.example")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        blocks = export_catalog(
+            options['export_format'],
+            base_url=options['base_url'].rstrip('/'),
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+        )
+        try:
+            if options['path'] == '-':
+                for block in blocks:
+                    sys.stdout.buffer.write(block)
+                sys.stdout.buffer.flush()
+                return
+            with open(options['path'], 'wb') as file:
+                for block in blocks:
+                    file.write(block)
+        except OSError as e:
+            raise CommandError(str(e))
+        self.stderr.write(self.style.SUCCESS(f"Каталог выгружен в {options['path']}"))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DataError, IntegrityError
+
+from shop.catalog_import import DEFAULT_BATCH_SIZE, import_stock, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Импорт размеров, цен и остатков из CSV/XLSX (колонки: sku, size, price, stock)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к файлу .csv или .xlsx")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Показать изменения без записи в базу")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_stock(
+                    iter_rows(file, options['path']),
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ValueError, ImportError, DataError, IntegrityError) as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - started
+        for sku, size, field, old, new in report.changes:
+            self.stdout.write(f"{sku} {size} {field}: {old} -> {new}")
+        for line_number, error in report.errors:
+            self.stderr.write(f"Строка {line_number}: {error}")
+
+        rate = report.rows / elapsed * 60 if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"{report.summary()} за {elapsed:.1f} с ({rate:.0f} строк/мин)"))
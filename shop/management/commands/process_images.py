@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from shop.image_pipeline import iter_uploaded_images, process_image_now
+from shop.models import ProcessedImage
+
+
+class Command(BaseCommand):
+    help = "Обработать загруженные изображения каталога (варианты WebP/JPEG, размеры, хеши)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Обработать заново уже готовые изображения")
+
+    def handle(self, *args, **options):
+        ready = set()
+        if not options['force']:
+            ready = set(ProcessedImage.objects.filter(
+                status=ProcessedImage.STATUS_READY
+            ).values_list('original', flat=True))
+
+        processed = failed = 0
+        for file in iter_uploaded_images():
+            if file.name in ready:
+                continue
+            ready.add(file.name)
+            if process_image_now(file):
+                processed += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Ошибка обработки {file.name}")
+
+        self.stdout.write(self.style.SUCCESS(f"Обработано {processed}, ошибок {failed}"))
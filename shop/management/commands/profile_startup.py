@@ -0,0 +1,182 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Код дочерних процессов: холодный старт воркера до первого ответа
+WSGI_CHILD = '''
+import json, sys, time
+from io import BytesIO
+from SneakersShop.wsgi import application
+import shop.warmup
+loaded = time.time()
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1', 'HTTP_HOST': 'localhost',
+    'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+}
+statuses = []
+b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+print(json.dumps({'loaded': loaded, 'done': time.time(), 'status': int(statuses[0].split()[0]),
+                  'warmup': shop.warmup.last_report}))
+'''
+
+ASGI_CHILD = '''
+import asyncio, json, sys, time
+from SneakersShop.asgi import application
+import shop.warmup
+loaded = time.time()
+
+async def first_request():
+    messages = []
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': sys.argv[1], 'raw_path': sys.argv[1].encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost')], 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]['status']
+
+status = asyncio.run(first_request())
+print(json.dumps({'loaded': loaded, 'done': time.time(), 'status': status, 'warmup': shop.warmup.last_report}))
+'''
+
+# Обновление без подходящего обработчика: проходит весь конвейер диспетчера без запросов к Telegram
+BOT_CHILD = '''
+import asyncio, json, time
+import telegram_bot
+from aiogram import types
+loaded = time.time()
+
+async def first_update():
+    update = types.Update.model_validate({
+        'update_id': 1,
+        'message': {
+            'message_id': 1, 'date': 0, 'text': 'startup profile',
+            'chat': {'id': 1, 'type': 'private'}, 'from': {'id': 1, 'is_bot': False, 'first_name': 'profile'},
+        },
+    }, context={'bot': telegram_bot.bot})
+    await telegram_bot.dp.feed_update(telegram_bot.bot, update)
+
+asyncio.run(first_update())
+print(json.dumps({'loaded': loaded, 'done': time.time(), 'status': None, 'warmup': None}))
+'''
+
+# URLconf Django загружает при первом запросе, в профиль импорта он входит явно
+LOAD_URLCONF = '; from django.urls import get_resolver; get_resolver().url_patterns'
+TARGETS = {
+    'wsgi': (WSGI_CHILD, 'from SneakersShop.wsgi import application' + LOAD_URLCONF),
+    'asgi': (ASGI_CHILD, 'from SneakersShop.asgi import application' + LOAD_URLCONF),
+    'bot': (BOT_CHILD, 'import telegram_bot'),
+}
+
+
+def parse_importtime(output):
+    """
+    Parses ``python -X importtime`` output.
+
+    Returns:
+        list: (module, self us, cumulative us) in import order.
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+class Command(BaseCommand):
+    help = ("Профиль холодного старта: время импорта по модулям (-X importtime), "
+            "время до первого ответа WSGI/ASGI-воркера и до первого обновления бота")
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='*', help="wsgi, asgi, bot (по умолчанию все)")
+        parser.add_argument('--path', default='/api/categories/', help="Путь первого запроса")
+        parser.add_argument('--runs', type=int, default=3, help="Число холодных стартов на цель (медиана)")
+        parser.add_argument('--top', type=int, default=15, help="Сколько модулей и пакетов показать")
+        parser.add_argument('--no-warmup', action='store_true', help="Запуск без прогрева (DJANGO_STARTUP_WARMUP=0)")
+
+    def handle(self, *args, **options):
+        base_env = dict(os.environ)
+        base_env['DJANGO_SETTINGS_MODULE'] = os.environ.get('DJANGO_SETTINGS_MODULE', 'SneakersShop.settings')
+        base_env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')]))
+        if options['no_warmup']:
+            base_env['DJANGO_STARTUP_WARMUP'] = '0'
+
+        targets = options['targets'] or list(TARGETS)
+        unknown = set(targets) - set(TARGETS)
+        if unknown:
+            raise CommandError(f"Unknown targets: {', '.join(sorted(unknown))}")
+
+        for target in targets:
+            env = dict(base_env)
+            if target in ('wsgi', 'asgi'):
+                env['DJANGO_DEPLOYMENT_PROFILE'] = target
+            child, import_statement = TARGETS[target]
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {target} =="))
+            self.report_imports(import_statement, env, options['top'])
+            self.report_first_response(target, child, env, options['path'], options['runs'])
+
+    def run_child(self, args, env):
+        return subprocess.run(
+            [sys.executable, *args], env=env, cwd=str(settings.BASE_DIR),
+            capture_output=True, text=True
+        )
+
+    def report_imports(self, import_statement, env, top):
+        result = self.run_child(['-X', 'importtime', '-c', import_statement], env)
+        if result.returncode != 0:
+            self.stderr.write(f"Import failed: {result.stderr.strip().splitlines()[-1:]}")
+            return
+        modules = parse_importtime(result.stderr)
+        by_package = defaultdict(int)
+        for name, self_us, _ in modules:
+            by_package[name.split('.')[0]] += self_us
+        total_ms = sum(by_package.values()) / 1000
+
+        self.stdout.write(f"Imports: {len(modules)} modules, {total_ms:.1f} ms")
+        self.stdout.write("  by package (self ms):")
+        for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"    {package:<32} {self_us / 1000:8.1f}  {self_us / 10 / total_ms:5.1f}%")
+        self.stdout.write("  slowest modules (self ms / cumulative ms):")
+        for name, self_us, cumulative_us in sorted(modules, key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"    {name:<48} {self_us / 1000:8.1f} {cumulative_us / 1000:8.1f}")
+
+    def report_first_response(self, target, child, env, path, runs):
+        timings = []
+        for _ in range(runs):
+            started = time.time()
+            result = self.run_child(['-c', child, path], env)
+            if result.returncode != 0:
+                self.stderr.write(f"{target} failed: {result.stderr.strip().splitlines()[-1:]}")
+                return
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+            timings.append((report['loaded'] - started, report['done'] - report['loaded'], report))
+
+        label = 'first update' if target == 'bot' else f"first request {path}"
+        boot = statistics.median(timing[0] for timing in timings) * 1000
+        first = statistics.median(timing[1] for timing in timings) * 1000
+        report = timings[-1][2]
+        self.stdout.write(
+            f"Cold start (median of {runs}): ready {boot:.1f} ms + {label} {first:.1f} ms = {boot + first:.1f} ms"
+            + (f" [status {report['status']}]" if report['status'] else '')
+        )
+        if report['warmup']:
+            steps = ', '.join(f"{step} {ms:.1f} ms" for step, ms in report['warmup'].items())
+            self.stdout.write(f"  warmup: {steps}")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Product
+from shop.size_summary import refresh_size_summaries
+
+
+class Command(BaseCommand):
+    help = "Пересчитать сводку размеров (available_sizes) для всех товаров"
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.values_list('pk', flat=True))
+        refresh_size_summaries(product_ids)
+        self.stdout.write(self.style.SUCCESS(f"Обновлено товаров: {len(product_ids)}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.popularity import update_popularity_scores
+
+
+class Command(BaseCommand):
+    help = "Пересчитать затухающую популярность товаров по накопленным просмотрам и заказам"
+
+    def handle(self, *args, **options):
+        updated = update_popularity_scores()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано товаров: {updated}"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from shop.catalog_cache import BRAND_LISTING, CATEGORY_LISTING, PRODUCT, warm_entries
+from shop.models import Brand, Category, Product
+
+
+class Command(BaseCommand):
+    help = "Прогреть кеш API каталога: карточки товаров и списки по категориям и брендам"
+
+    def handle(self, *args, **options):
+        entries = [(PRODUCT, str(pk)) for pk in Product.objects.filter(is_active=True).values_list('pk', flat=True)]
+        entries += [
+            (CATEGORY_LISTING, slug) for slug in Category.objects.filter(is_active=True).values_list('slug', flat=True)
+        ]
+        entries += [(BRAND_LISTING, slug) for slug in Brand.objects.values_list('slug', flat=True)]
+        warm_entries(entries)
+        self.stdout.write(self.style.SUCCESS(f"Прогрето записей: {len(entries)}"))
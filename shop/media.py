@@ -0,0 +1,96 @@
+# media.py
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .compression import choose_encoding
+
+# Режимы отдачи медиа в production:
+#   x-accel    — nginx отдаёт файл сам по заголовку X-Accel-Redirect (internal location)
+#   x-sendfile — Apache mod_xsendfile / lighttpd по заголовку X-Sendfile
+#   sendfile   — FileResponse; WSGI-сервер с wsgi.file_wrapper (gunicorn) отдаёт файл через sendfile()
+MEDIA_SERVING_MODES = ('x-accel', 'x-sendfile', 'sendfile')
+# Каталоги с версионированными файлами, которые не меняются по тому же URL
+IMMUTABLE_PREFIXES = ('variants/', 'catalog/catalog.')
+PRECOMPRESSED_EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+PRECOMPRESSED_TYPES = ('application/json', 'text/')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache_control(path):
+    if path.startswith(IMMUTABLE_PREFIXES) and not path.endswith('.latest.json'):
+        return 'public, max-age=31536000, immutable'
+    return f"public, max-age={_setting('MEDIA_CACHE_MAX_AGE', 3600)}"
+
+
+def _precompressed(request, full_path, content_type):
+    """Готовый .br/.gz рядом с файлом (например, снимок каталога), если клиент его принимает"""
+    if not (content_type or '').startswith(PRECOMPRESSED_TYPES):
+        return full_path, None
+    available = tuple(
+        encoding for encoding, extension in PRECOMPRESSED_EXTENSIONS.items()
+        if os.path.isfile(full_path + extension)
+    )
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'), available) if available else None
+    if encoding is None:
+        return full_path, None
+    return full_path + PRECOMPRESSED_EXTENSIONS[encoding], encoding
+
+
+def serve_media(request, path):
+    """
+    Serves MEDIA_ROOT files without copying their bytes through Python.
+
+    Depending on MEDIA_SERVING_MODE the response only carries a redirect header
+    for the front web server, or a FileResponse the WSGI server sends with
+    sendfile().
+    """
+    mode = _setting('MEDIA_SERVING_MODE', 'sendfile')
+    if mode not in MEDIA_SERVING_MODES:
+        raise ImproperlyConfigured(f"Unknown MEDIA_SERVING_MODE: {mode}")
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    if mode == 'sendfile':
+        file_path, encoding = _precompressed(request, full_path, content_type)
+    else:
+        # Фронтовый сервер сам выбирает .gz/.br (gzip_static/brotli_static в nginx)
+        file_path, encoding = full_path, None
+    stat = os.stat(file_path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    if mode == 'x-accel':
+        response = HttpResponse(content_type=content_type)
+        relative_path = os.path.relpath(file_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = quote(_setting('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/') + relative_path)
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = file_path
+    else:
+        response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+        response['Content-Length'] = str(stat.st_size)
+
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = _cache_control(path)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if mode == 'sendfile' and content_type.startswith(PRECOMPRESSED_TYPES):
+        response['Vary'] = 'Accept-Encoding'
+    return response
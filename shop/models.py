@@ -106,6 +106,38 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Сводка размеров по всем активным моделям: [{'size', 'price' (минимальная), 'stock' (суммарный)}].
+    # Пересчитывается при изменении размеров (см. size_summary.py)
+    size_summary = models.JSONField(default=list, blank=True, editable=False)
+    # Диапазон цен размеров активных моделей, поддерживается вместе со сводкой размеров
+    min_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    max_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    # Затухающая популярность (просмотры и заказы), пересчитывается периодически (см. popularity.py)
+    popularity = models.FloatField(default=0, editable=False)
+    # Отпечаток признаков, по которому были рассчитаны похожие товары (см. similarity.py)
+    similar_fingerprint = models.CharField(max_length=32, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Фильтр и сортировка по цене и новинкам с keyset-пагинацией (id — уникальный хвост ключа)
+            models.Index(fields=['is_active', 'min_price', 'id'], name='product_active_price_idx'),
+            models.Index(fields=['is_active', 'max_price'], name='product_active_max_price_idx'),
+            models.Index(fields=['is_active', 'created_at', 'id'], name='product_active_created_idx'),
+            models.Index(fields=['is_active', 'popularity', 'id'], name='product_active_popularity_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -145,13 +177,25 @@ class ProductModel(models.Model):
     def __str__(self):
         return f"{self.product.title} - {self.color}"
 
+    def _prefetched_sizes(self):
+        # Если размеры уже предзагружены, считаем без дополнительного запроса
+        if 'sizes' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.sizes.all()
+        return None
+
     @property
     def min_price(self):
+        sizes = self._prefetched_sizes()
+        if sizes is not None:
+            return min((size.price for size in sizes), default=0)
         return self.sizes.aggregate(min_price=Min('price'))['min_price'] or 0
 
     # Добавляем свойство для получения максимальной цены модели
     @property
     def max_price(self):
+        sizes = self._prefetched_sizes()
+        if sizes is not None:
+            return max((size.price for size in sizes), default=0)
         return self.sizes.aggregate(max_price=Max('price'))['max_price'] or 0
 
 
@@ -203,4 +247,90 @@ class ModelImage(models.Model):  # Переименовали ProductImage в Mo
         ordering = ['order_index']
 
     def __str__(self):
-        return f"Image for {self.model}"
\ No newline at end of file
+        return f"Image for {self.model}"
+
+class ProcessedImage(models.Model):
+    """Результат фоновой обработки загруженного изображения (варианты, размеры, хеши)"""
+    STATUS_PENDING = 'pending'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'В обработке'),
+        (STATUS_READY, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    )
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    original = models.CharField(  # Имя исходного файла в хранилище
+        max_length=255,
+        unique=True
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING
+    )
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)  # sha256 исходного файла
+    perceptual_hash = models.CharField(max_length=16, blank=True)  # dHash 64 бита
+    variants = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.original} ({self.status})"
+
+
+class ProductPopularity(models.Model):
+    """
+    Счётчики просмотров и заказов товара. Пишутся пачками из памяти процесса,
+    отдельная узкая таблица не раздувает строки Product частыми обновлениями.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity_stats'
+    )
+    views = models.PositiveBigIntegerField(default=0)
+    orders = models.PositiveBigIntegerField(default=0)
+    # Значения счётчиков и время последнего пересчёта score
+    scored_views = models.PositiveBigIntegerField(default=0)
+    scored_orders = models.PositiveBigIntegerField(default=0)
+    score = models.FloatField(default=0)
+    scored_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.score:.2f}"
+
+
+class SimilarProduct(models.Model):
+    """
+    Похожие товары, заранее рассчитанные batch-задачей (см. similarity.py):
+    top-K соседей товара в порядке rank.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='similar_links'
+    )
+    similar = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='similar_to'
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        # Индекс (product, rank) отдаёт список соседей одним запросом в нужном порядке
+        unique_together = ('product', 'rank')
+
+    def __str__(self):
+        return f"{self.product_id} #{self.rank}: {self.similar_id}"
@@ -0,0 +1,171 @@
+# orders.py
+import threading
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import ModelSize
+
+CATALOG_VERSION_KEY = 'shop:catalog_version'
+# Страховочный TTL на случай, если CACHES не общий между процессами (LocMemCache)
+PRICE_CACHE_TTL = 30
+
+LINE_OK = 'ok'
+LINE_UNKNOWN = 'unknown'
+LINE_OUT_OF_STOCK = 'out_of_stock'
+LINE_INSUFFICIENT_STOCK = 'insufficient_stock'
+
+
+def get_catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+class CatalogPriceCache:
+    """
+    In-process cache of (sku, size) -> catalog line.
+
+    Entries are dropped when the shared catalog version changes or the TTL expires;
+    missing keys are loaded with one batched query.
+    """
+
+    def __init__(self, ttl=PRICE_CACHE_TTL):
+        self.ttl = ttl
+        self._lines = {}
+        self._version = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._lines = {}
+            self._version = None
+
+    def get_many(self, keys):
+        version = get_catalog_version()
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version or now - self._loaded_at > self.ttl:
+                self._lines = {}
+                self._version = version
+                self._loaded_at = now
+            lines = self._lines
+            missing = {key for key in keys if key not in lines}
+
+        if missing:
+            loaded = self._load(missing)
+            with self._lock:
+                if self._version == version:
+                    self._lines.update(loaded)
+            lines = {**lines, **loaded}
+
+        return {key: lines.get(key) for key in keys}
+
+    @staticmethod
+    def _load(keys):
+        skus = {sku for sku, _ in keys}
+        sizes = {size for _, size in keys}
+        queryset = ModelSize.objects.filter(
+            model__sku__in=skus,
+            size__in=sizes,
+            model__is_active=True,
+            model__product__is_active=True,
+        ).select_related('model__product').only(
+            'size', 'price', 'stock',
+            'model__sku', 'model__color',
+            'model__product__title',
+        )
+
+        loaded = {key: None for key in keys}
+        for model_size in queryset:
+            key = (model_size.model.sku, model_size.size)
+            if key in loaded:
+                loaded[key] = {
+                    'title': model_size.model.product.title,
+                    'color': model_size.model.color,
+                    'price': model_size.price,
+                    'stock': model_size.stock,
+                }
+        return loaded
+
+
+price_cache = CatalogPriceCache()
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value))
+    except Exception:
+        return None
+
+
+def validate_order(items, client_total=None):
+    """
+    Validates order lines against ProductModel.sku + ModelSize.size and reprices them.
+
+    Args:
+        items (list): Order lines with sku, size, quantity and client price.
+        client_total: Total amount calculated by the client.
+
+    Returns:
+        dict: Repriced lines, server total and validation flags.
+    """
+    keys = [(item['sku'], _to_decimal(item['size'])) for item in items]
+    catalog = price_cache.get_many(keys)
+
+    lines = []
+    total_amount = Decimal('0')
+    is_valid = True
+    for item, key in zip(items, keys):
+        quantity = item['quantity']
+        client_price = _to_decimal(item.get('price'))
+        line = {
+            'sku': item['sku'],
+            'size': key[1],
+            'quantity': quantity,
+            'client_price': client_price,
+        }
+        catalog_line = catalog.get(key)
+        if catalog_line is None:
+            is_valid = False
+            line.update(status=LINE_UNKNOWN, price=client_price, stock=0)
+        else:
+            stock = catalog_line['stock']
+            if stock <= 0:
+                status = LINE_OUT_OF_STOCK
+            elif stock < quantity:
+                status = LINE_INSUFFICIENT_STOCK
+            else:
+                status = LINE_OK
+            line.update(
+                status=status,
+                title=catalog_line['title'],
+                color=catalog_line['color'],
+                price=catalog_line['price'],
+                stock=stock,
+            )
+            total_amount += catalog_line['price'] * quantity
+
+        line['price_changed'] = (
+            line['price'] is not None and client_price is not None and line['price'] != client_price
+        )
+        lines.append(line)
+
+    client_total = _to_decimal(client_total) if client_total is not None else None
+    return {
+        'items': lines,
+        'total_amount': total_amount,
+        'client_total': client_total,
+        'total_mismatch': client_total is not None and client_total != total_amount,
+        'is_valid': is_valid,
+        'has_stock_shortfall': any(
+            line['status'] in (LINE_OUT_OF_STOCK, LINE_INSUFFICIENT_STOCK) for line in lines
+        ),
+    }
@@ -0,0 +1,123 @@
+# pagination.py
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Field, Func, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RowValue(Func):
+    """Конструктор строки SQL ``(a, b, ...)`` для сравнения ключа целиком"""
+    template = '(%(expressions)s)'
+    # Тип без приведения: у DecimalField SQLite обернул бы всю строку в CAST
+    output_field = Field()
+
+
+def _keyset_fields(ordering):
+    """
+    Поля ключа для постраничного перехода или None, если сортировка не подходит:
+    нужны обычные поля в одном направлении с уникальным id в конце.
+    """
+    if not ordering or not all(isinstance(field, str) for field in ordering):
+        return None
+    if ordering[-1].lstrip('-') not in ('id', 'pk'):
+        return None
+    descending = {field.startswith('-') for field in ordering}
+    if len(descending) != 1:
+        return None
+    return [field.lstrip('-') for field in ordering], ordering[0].startswith('-')
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination: ?limit=N, then ?cursor=<X-Next-Cursor>.
+
+    The next page continues after the last row's sort key, so every page is an
+    index range scan regardless of depth. Without ``limit`` the full list is
+    returned as before.
+    """
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    max_limit = 100
+
+    def __init__(self):
+        self.request = None
+        self.limit = None
+        self.keyset = None
+        self.next_cursor = None
+
+    def get_limit(self, query_params):
+        try:
+            limit = int(query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return None
+        return min(max(limit, 1), self.max_limit)
+
+    def decode_cursor(self, model, fields, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if len(values) != len(fields):
+                raise ValueError
+            return [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+        except (TypeError, ValueError, ValidationError, FieldDoesNotExist):
+            raise NotFound('Invalid cursor')
+
+    @staticmethod
+    def encode_cursor(instance, fields):
+        values = [getattr(instance, field) for field in fields]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Срез запроса для текущей страницы (на одну строку больше лимита) или None,
+        если ``limit`` не передан. Не обращается к БД — подходит и для async-представлений.
+        """
+        query_params = getattr(request, 'query_params', request.GET)
+        limit = self.get_limit(query_params)
+        if limit is None:
+            return None
+        self.request = request
+        self.limit = limit
+        self.keyset = _keyset_fields(queryset.query.order_by)
+
+        cursor = query_params.get(self.cursor_query_param)
+        if cursor and self.keyset:
+            fields, descending = self.keyset
+            values = self.decode_cursor(queryset.model, fields, cursor)
+            # (a, id) > (va, vid): одно условие по строке, которое база проверяет
+            # диапазоном составного индекса (a, id) вместо OR по каждому полю
+            model_fields = [queryset.model._meta.get_field(field) for field in fields]
+            comparison = LessThan if descending else GreaterThan
+            queryset = queryset.filter(comparison(
+                RowValue(*(F(field) for field in fields)),
+                RowValue(*(Value(value, output_field=field) for field, value in zip(model_fields, values))),
+            ))
+        return queryset[:limit + 1]
+
+    def set_page(self, instances):
+        instances = list(instances)
+        if len(instances) > self.limit and self.keyset:
+            self.next_cursor = self.encode_cursor(instances[self.limit - 1], self.keyset[0])
+        return instances[:self.limit]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request)
+        if page_queryset is None:
+            return None
+        return self.set_page(page_queryset)
+
+    def get_response_headers(self):
+        if self.next_cursor is None:
+            return {}
+        url = replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+        return {'X-Next-Cursor': self.next_cursor, 'Link': f'<{url}>; rel="next"'}
+
+    def get_paginated_response(self, data):
+        # Тело ответа остаётся списком, как и без пагинации
+        return Response(data, headers=self.get_response_headers())
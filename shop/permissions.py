@@ -0,0 +1,16 @@
+# permissions.py
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+SERVICE_TOKEN_HEADER = 'HTTP_X_SERVICE_TOKEN'
+
+
+class HasServiceToken(BasePermission):
+    """Доступ для внутренних сервисов (бота) по общему токену SHOP_SERVICE_TOKEN"""
+
+    def has_permission(self, request, view):
+        expected = getattr(settings, 'SHOP_SERVICE_TOKEN', '')
+        token = request.META.get(SERVICE_TOKEN_HEADER, '')
+        return bool(expected) and hmac.compare_digest(token.encode(), expected.encode())
@@ -0,0 +1,208 @@
+# popularity.py
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Product, ProductModel, ProductPopularity
+
+logger = logging.getLogger(__name__)
+
+# Ниже этого значения популярность считается нулевой и больше не пересчитывается
+MIN_SCORE = 0.01
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def flush_counters(views, orders):
+    """
+    Adds batched view/order increments to ProductPopularity: one insert of the
+    missing rows and one UPDATE with ``F()`` increments, safe across processes.
+    """
+    product_ids = sorted(
+        str(pk) for pk in Product.objects.filter(pk__in=set(views) | set(orders)).values_list('pk', flat=True)
+    )
+    if not product_ids:
+        return
+    with transaction.atomic():
+        ProductPopularity.objects.bulk_create(
+            [ProductPopularity(product_id=product_id) for product_id in product_ids],
+            ignore_conflicts=True
+        )
+        ProductPopularity.objects.bulk_update(
+            [
+                ProductPopularity(
+                    product_id=product_id,
+                    views=F('views') + views.get(product_id, 0),
+                    orders=F('orders') + orders.get(product_id, 0)
+                )
+                for product_id in product_ids
+            ],
+            ['views', 'orders']
+        )
+
+
+def update_popularity_scores():
+    """
+    Decays scores by the time since their last update and adds the views and
+    orders counted since then; copies the result to Product.popularity.
+
+    Running it from several processes is safe: rows are locked while they are
+    recomputed and the decay depends only on the elapsed time.
+
+    Returns:
+        int: Number of recomputed products.
+    """
+    now = timezone.now()
+    half_life = _setting('POPULARITY_HALF_LIFE_HOURS', 72) * 3600
+    view_weight = _setting('POPULARITY_VIEW_WEIGHT', 1)
+    order_weight = _setting('POPULARITY_ORDER_WEIGHT', 20)
+
+    with transaction.atomic():
+        rows = list(ProductPopularity.objects.select_for_update().filter(
+            Q(score__gt=0) | Q(views__gt=F('scored_views')) | Q(orders__gt=F('scored_orders'))
+        ).order_by('pk'))
+        for row in rows:
+            elapsed = max((now - row.scored_at).total_seconds(), 0) if row.scored_at else 0
+            score = row.score * 0.5 ** (elapsed / half_life)
+            score += view_weight * (row.views - row.scored_views) + order_weight * (row.orders - row.scored_orders)
+            row.score = score if score >= MIN_SCORE else 0
+            row.scored_views = row.views
+            row.scored_orders = row.orders
+            row.scored_at = now
+
+        ProductPopularity.objects.bulk_update(
+            rows, ['score', 'scored_views', 'scored_orders', 'scored_at'], batch_size=500
+        )
+        Product.objects.bulk_update(
+            [Product(pk=row.product_id, popularity=row.score) for row in rows], ['popularity'], batch_size=500
+        )
+    return len(rows)
+
+
+class PopularityCounters:
+    """
+    Per-process view and order counters.
+
+    Recording is a dict increment; a background thread flushes the totals in
+    one batch every ``flush_interval`` seconds and recomputes popularity every
+    ``score_interval`` seconds, so page views never write to the database.
+    """
+
+    def __init__(self, flush_interval, score_interval):
+        self.flush_interval = flush_interval
+        self.score_interval = score_interval
+        self._lock = threading.Lock()
+        self._views = Counter()
+        self._orders = Counter()
+        self._thread = None
+        self._pid = None
+
+    def record_view(self, product_id):
+        self._add(self._views, product_id, 1)
+
+    def record_order(self, product_id, quantity=1):
+        self._add(self._orders, product_id, quantity)
+
+    def _add(self, counter, product_id, amount):
+        with self._lock:
+            counter[str(product_id)] += amount
+            # Поток не переживает fork, поэтому проверяем процесс
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='popularity-flush', daemon=True)
+                self._thread.start()
+
+    def _take(self):
+        with self._lock:
+            views, orders = self._views, self._orders
+            self._views, self._orders = Counter(), Counter()
+        return views, orders
+
+    def flush(self):
+        views, orders = self._take()
+        if not views and not orders:
+            return
+        try:
+            flush_counters(views, orders)
+        except Exception:
+            # Возвращаем счётчики, чтобы не потерять их до следующей попытки
+            with self._lock:
+                self._views.update(views)
+                self._orders.update(orders)
+            raise
+
+    def _run(self):
+        last_scored = time.monotonic()
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if time.monotonic() - last_scored >= self.score_interval:
+                    update_popularity_scores()
+                    last_scored = time.monotonic()
+            except Exception:
+                logger.exception("Error flushing popularity counters")
+            finally:
+                connection.close()
+
+
+_counters = None
+_counters_lock = threading.Lock()
+
+
+def get_counters():
+    global _counters
+    with _counters_lock:
+        if _counters is None:
+            _counters = PopularityCounters(
+                _setting('POPULARITY_FLUSH_SECONDS', 5),
+                _setting('POPULARITY_SCORE_SECONDS', 300)
+            )
+            atexit.register(_flush_on_exit)
+        return _counters
+
+
+def _flush_on_exit():
+    try:
+        _counters.flush()
+    except Exception:
+        logger.exception("Error flushing popularity counters on exit")
+
+
+def record_view(product_id):
+    if _setting('POPULARITY_ENABLED', True):
+        get_counters().record_view(product_id)
+
+
+def record_order(product_id, quantity=1):
+    if _setting('POPULARITY_ENABLED', True):
+        get_counters().record_order(product_id, quantity)
+
+
+def record_order_lines(items):
+    """
+    Counts an accepted order: order lines (sku, quantity) are mapped to their
+    products with one query.
+
+    Returns:
+        int: Number of counted lines.
+    """
+    skus = {item['sku'] for item in items}
+    product_ids = dict(ProductModel.objects.filter(sku__in=skus).values_list('sku', 'product_id'))
+    counted = 0
+    for item in items:
+        product_id = product_ids.get(item['sku'])
+        if product_id is not None:
+            record_order(product_id, item['quantity'])
+            counted += 1
+    return counted
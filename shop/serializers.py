@@ -2,17 +2,32 @@ import base64
 
 import rest_framework.serializers
 from rest_framework import serializers
+from .image_pipeline import image_source_path
 from .models import *
 
 
+def read_image_base64(path):
+    with open(path, 'rb') as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8')
+
+
+def encode_image(value):
+    # Отдаём обработанный вариант, а не исходный многомегабайтный файл
+    return read_image_base64(image_source_path(value))
+
+
 class Base64ImageField(serializers.ImageField):
     def to_representation(self, value):
         if not value:
             return None
 
+        # Асинхронные представления заранее читают файлы и передают их через контекст
+        image_cache = self.context.get('image_cache')
+        if image_cache is not None and value.name in image_cache:
+            return image_cache[value.name]
+
         try:
-            with open(value.path, 'rb') as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+            return encode_image(value)
         except Exception as e:
             print(f"Error encoding image: {e}")
             return None
@@ -27,6 +42,23 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ('id', 'name', 'slug', 'parent_id', 'level', 'is_active', 'image')
 
+class SparseFieldsMixin:
+    """Оставляет только поля из context['fieldset']; нераскрытые связи отдаются id"""
+    # Поле вместо вложенного сериализатора, если связь не указана в ?expand=
+    collapsed_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fieldset = self.context.get('fieldset')
+        if fieldset is None or fieldset.is_default:
+            return
+        for name in list(self.fields):
+            if not fieldset.wants(name):
+                self.fields.pop(name)
+            elif name in self.collapsed_fields and not fieldset.is_expanded(name):
+                self.fields[name] = self.collapsed_fields[name]()
+
+
 class ModelImageSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
     class Meta:
@@ -59,13 +91,20 @@ class ProductModelSerializer(serializers.ModelSerializer):
         model = ProductModel
         fields = ('id', 'color', 'sku', 'sizes', 'images', 'min_price', 'max_price')
 
+class ProductModelBatchSerializer(SparseFieldsMixin, ProductModelSerializer):
+    product_id = serializers.UUIDField(read_only=True)
+
+    class Meta(ProductModelSerializer.Meta):
+        fields = ('product_id',) + ProductModelSerializer.Meta.fields
+
+
 class BrandSerializer(serializers.ModelSerializer):
     logo = Base64ImageField()
     class Meta:
         model = Brand
         fields = ('id', 'name', 'slug', 'logo')
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     main_image = serializers.SerializerMethodField()
     categories = serializers.SlugRelatedField(
         many=True,
@@ -76,13 +115,26 @@ class ProductListSerializer(serializers.ModelSerializer):
     brand = BrandSerializer(read_only=True)
     available_sizes = serializers.SerializerMethodField()  # Добавляем доступные размеры
 
+    collapsed_fields = {
+        'brand': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'models': lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+    }
+
     class Meta:
         model = Product
         fields = ('id', 'title', 'slug', 'base_price', 'categories', 'main_image', 'brand', 'available_sizes')
 
     def get_main_image(self, obj):
+        image_field = Base64ImageField()
+        image_field.bind('main_image', self)
         if obj.image:
-            return Base64ImageField().to_representation(obj.image)
+            return image_field.to_representation(obj.image)
+
+        # Используем предзагруженные модели и изображения, если они есть
+        if 'models' in getattr(obj, '_prefetched_objects_cache', {}):
+            images = [image for product_model in obj.models.all() for image in product_model.images.all()]
+            main_image = next((image for image in images if image.is_main), None) or next(iter(images), None)
+            return image_field.to_representation(main_image.image) if main_image else None
 
         main_model_image = ModelImage.objects.filter(
             model__product=obj,
@@ -99,19 +151,27 @@ class ProductListSerializer(serializers.ModelSerializer):
         return ModelImageSerializer(first_image).data['image'] if first_image else None
 
     def get_available_sizes(self, obj):
-        sizes = []
-        for product_model in obj.models.all():
-            for size in product_model.sizes.all():
-                sizes.append({
-                    'size': size.size,
-                    'price': size.price,
-                    'stock': size.stock
-                })
-        return sizes
+        # Сводка поддерживается при изменении размеров: уникальные размеры с минимальной ценой и общим остатком
+        return obj.size_summary
 
 
 class ProductDetailSerializer(ProductListSerializer):
     models = ProductModelSerializer(many=True)
 
     class Meta(ProductListSerializer.Meta):
-        fields = ProductListSerializer.Meta.fields + ('description', 'models')
\ No newline at end of file
+        fields = ProductListSerializer.Meta.fields + ('description', 'models')
+
+class OrderItemSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=50)
+    size = serializers.DecimalField(max_digits=4, decimal_places=1)
+    quantity = serializers.IntegerField(min_value=1)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+
+class OrderValidationSerializer(serializers.Serializer):
+    items = OrderItemSerializer(many=True, allow_empty=False)
+    totalAmount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+
+
+class OrderRecordSerializer(serializers.Serializer):
+    items = OrderItemSerializer(many=True, allow_empty=False)
@@ -0,0 +1,148 @@
+# signals.py
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from django.conf import settings
+
+from .catalog_cache import affected_entries, cache_enabled, schedule_cache_warm
+from .catalog_snapshot import schedule_snapshot_rebuild
+from .image_pipeline import IMAGE_FIELDS, enqueue_image
+from .models import Brand, Category, ModelImage, ModelSize, Product, ProductCategory, ProductModel
+from .orders import bump_catalog_version
+from .size_summary import schedule_size_summary_refresh
+from .stock_events import publish_stock_changes, stock_event
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductModel)
+@receiver([post_save, post_delete], sender=ModelSize)
+def catalog_price_changed(sender, **kwargs):
+    # Любое изменение цен/остатков делает кеш цен устаревшим
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductModel)
+@receiver([post_save, post_delete], sender=ModelSize)
+@receiver([post_save, post_delete], sender=ModelImage)
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver(m2m_changed, sender=Product.categories.through)
+def catalog_snapshot_changed(sender, **kwargs):
+    # Несколько правок подряд приводят к одной пересборке снимка витрины
+    schedule_snapshot_rebuild()
+
+
+@receiver(post_save, sender=ModelImage)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def image_uploaded(sender, instance, **kwargs):
+    # Новые изображения обрабатываются в пуле процессов после фиксации транзакции
+    if getattr(settings, 'IMAGE_PIPELINE_ENABLED', True):
+        enqueue_image(getattr(instance, IMAGE_FIELDS[sender]))
+
+
+@receiver([post_save, post_delete], sender=ModelSize)
+def size_changed(sender, instance, using, **kwargs):
+    # Сохранение формы с инлайнами меняет десятки размеров: товар пересчитывается один раз после фиксации
+    schedule_size_summary_refresh(model_ids=[instance.model_id], using=using)
+
+
+@receiver([post_save, post_delete], sender=ProductModel)
+def product_model_changed(sender, instance, using, **kwargs):
+    # Неактивные модели не входят в сводку размеров
+    schedule_size_summary_refresh(product_ids=[instance.product_id], using=using)
+
+
+@receiver(pre_save, sender=Product)
+def product_brand_tracked(sender, instance, **kwargs):
+    # Запоминаем прежний бренд: товар нужно убрать из его списка
+    if not cache_enabled():
+        return
+    instance._previous_brand_id = Product.objects.filter(pk=instance.pk).values_list('brand_id', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def product_cache_changed(sender, instance, **kwargs):
+    schedule_cache_warm(
+        product_ids=[instance.pk],
+        brand_ids=[brand_id for brand_id in [getattr(instance, '_previous_brand_id', None)] if brand_id]
+    )
+
+
+@receiver([post_save, post_delete], sender=ProductModel)
+def product_model_cache_changed(sender, instance, **kwargs):
+    schedule_cache_warm(product_ids=[instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=ModelSize)
+@receiver([post_save, post_delete], sender=ModelImage)
+def model_child_cache_changed(sender, instance, **kwargs):
+    schedule_cache_warm(
+        product_ids=ProductModel.objects.filter(pk=instance.model_id).values_list('product_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Brand)
+def brand_cache_changed(sender, instance, **kwargs):
+    schedule_cache_warm(brand_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def category_cache_changed(sender, instance, **kwargs):
+    schedule_cache_warm(category_ids=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+def product_category_cache_changed(sender, instance, **kwargs):
+    schedule_cache_warm(product_ids=[instance.product_id], category_ids=[instance.category_id])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def product_categories_cache_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    # pre_clear: pk_set пуст, берём текущие связи до очистки
+    if reverse:
+        # instance — категория, pk_set — товары
+        schedule_cache_warm(
+            product_ids=pk_set or instance.products.values_list('pk', flat=True),
+            category_ids=[instance.pk]
+        )
+    else:
+        schedule_cache_warm(
+            product_ids=[instance.pk],
+            category_ids=pk_set or instance.categories.values_list('pk', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Product)
+@receiver(pre_delete, sender=Brand)
+@receiver(pre_delete, sender=Category)
+def catalog_object_deleted(sender, instance, **kwargs):
+    # После удаления связи уже не найти, поэтому записи кеша собираются заранее
+    if not cache_enabled():
+        return
+    if sender is Product:
+        entries = affected_entries(product_ids=[instance.pk])
+    elif sender is Brand:
+        entries = affected_entries(brand_ids=[instance.pk])
+    else:
+        entries = affected_entries(category_ids=[instance.pk])
+    schedule_cache_warm(entries=entries)
+
+
+@receiver(post_save, sender=ModelSize)
+@receiver(post_delete, sender=ModelSize)
+def stock_event_changed(sender, instance, **kwargs):
+    # Подписчики SSE получают новое состояние размера после фиксации транзакции
+    if not getattr(settings, 'STOCK_EVENTS_ENABLED', True):
+        return
+    product_model = ProductModel.objects.filter(pk=instance.model_id).values('product_id', 'sku').first()
+    if product_model is None:
+        return
+    event = stock_event(instance, product_model['product_id'], product_model['sku'], deleted='created' not in kwargs)
+    transaction.on_commit(lambda: publish_stock_changes([event]))
@@ -0,0 +1,273 @@
+# similarity.py
+import hashlib
+import json
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from .models import Product, ProductCategory, SimilarProduct
+
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только batch-задаче, API читает готовые списки из базы
+    np = None
+
+# Веса групп признаков: сходство товаров — взвешенная сумма косинусов по группам
+FEATURE_WEIGHTS = {
+    'brand': 3.0,
+    'categories': 2.0,
+    'title': 2.0,
+    'price': 1.5,
+    'sizes': 1.0,
+}
+# Ширина ценового диапазона по log2 цены (~19%); соседние диапазоны засчитываются наполовину
+PRICE_BAND_STEP = 0.25
+TOKEN_RE = re.compile(r'\w+')
+# Сколько строк матрицы сходства считается за раз (память: блок × число товаров)
+BLOCK_SIZE = 512
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def load_products():
+    """
+    Similarity inputs of active products: brand, categories, sizes in stock,
+    price band and title tokens, plus the fingerprint of the last build.
+    """
+    categories = defaultdict(set)
+    for through in (ProductCategory, Product.categories.through):
+        for product_id, category_id in through.objects.filter(
+            product__is_active=True
+        ).values_list('product_id', 'category_id'):
+            categories[product_id].add(str(category_id))
+
+    products = []
+    for product_id, brand_id, title, min_price, base_price, summary, stored in Product.objects.filter(
+        is_active=True
+    ).order_by('id').values_list(
+        'id', 'brand_id', 'title', 'min_price', 'base_price', 'size_summary', 'similar_fingerprint'
+    ):
+        price = min_price if min_price is not None else base_price
+        products.append({
+            'id': str(product_id),
+            'brand': str(brand_id) if brand_id else None,
+            'categories': sorted(categories[product_id]),
+            'sizes': sorted(entry['size'] for entry in summary if entry['stock'] > 0),
+            'price_band': math.floor(math.log2(price) / PRICE_BAND_STEP) if price and price > 0 else None,
+            'tokens': sorted(set(TOKEN_RE.findall(title.lower()))),
+            'stored_fingerprint': stored,
+        })
+    return products
+
+
+def fingerprint(product):
+    data = {key: value for key, value in product.items() if key not in ('id', 'stored_fingerprint')}
+    return hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def _group_features(products):
+    """Признаки каждой группы: для каждого товара список (значение, вес)"""
+    document_frequency = Counter(token for product in products for token in product['tokens'])
+    total = len(products)
+    for group in FEATURE_WEIGHTS:
+        if group == 'brand':
+            yield group, [[(product['brand'], 1.0)] if product['brand'] else [] for product in products]
+        elif group == 'categories':
+            yield group, [[(category, 1.0) for category in product['categories']] for product in products]
+        elif group == 'sizes':
+            yield group, [[(size, 1.0) for size in product['sizes']] for product in products]
+        elif group == 'price':
+            yield group, [
+                [(band, 1.0), (band - 1, 0.5), (band + 1, 0.5)] if band is not None else []
+                for band in (product['price_band'] for product in products)
+            ]
+        elif group == 'title':
+            # Слова, встречающиеся у одного товара, не влияют на сходство пар; редкие слова весомее (idf)
+            yield group, [
+                [
+                    (token, math.log(total / document_frequency[token]) + 1.0)
+                    for token in product['tokens'] if document_frequency[token] > 1
+                ]
+                for product in products
+            ]
+
+
+class FeatureMatrix:
+    """
+    Sparse float32 feature rows, one per product, stacked from per-group blocks.
+
+    Each block is L2-normalized per row and scaled by sqrt(weight), so the dot
+    product of two rows is the weighted sum of their per-group cosine
+    similarities. Only non-zero values are kept, by row (CSR) and by column
+    (products having the feature), so memory grows with the number of
+    features products actually have, not with vocabulary size × catalog size.
+    """
+
+    def __init__(self, size, rows, columns, values):
+        self.size = size
+        rows = np.asarray(rows, dtype=np.intp)
+        columns = np.asarray(columns, dtype=np.intp)
+        values = np.asarray(values, dtype=np.float32)
+        width = int(columns.max()) + 1 if len(columns) else 0
+
+        by_row = np.argsort(rows, kind='stable')
+        self.row_pointers = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=size))))
+        self.row_columns = columns[by_row]
+        self.row_values = values[by_row]
+
+        by_column = np.argsort(columns, kind='stable')
+        self.column_pointers = np.concatenate(([0], np.cumsum(np.bincount(columns, minlength=width))))
+        self.column_rows = rows[by_column]
+        self.column_values = values[by_column]
+
+    def __len__(self):
+        return self.size
+
+    def scores(self, rows):
+        """Dense block of dot products: the given rows × all rows."""
+        rows = np.asarray(rows, dtype=np.intp)
+        scores = np.zeros((len(rows), self.size), dtype=np.float32)
+        starts = self.row_pointers[rows]
+        lengths = self.row_pointers[rows + 1] - starts
+        # Номера ненулевых значений строк блока подряд: start строки + смещение внутри строки
+        offsets = np.cumsum(lengths) - lengths
+        entries = np.arange(lengths.sum()) - np.repeat(offsets - starts, lengths)
+        positions = np.repeat(np.arange(len(rows)), lengths)
+        columns, values = self.row_columns[entries], self.row_values[entries]
+
+        # По каждому признаку: строки блока с ним × товары с ним (разреженное произведение)
+        order = np.argsort(columns, kind='stable')
+        positions, columns, values = positions[order], columns[order], values[order]
+        bounds = np.flatnonzero(np.diff(columns)) + 1
+        for start, end in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(columns)]))):
+            if start == end:
+                continue
+            column = columns[start]
+            postings = slice(self.column_pointers[column], self.column_pointers[column + 1])
+            # Строка блока встречает признак один раз, товар в списке признака тоже — индексы без повторов
+            scores[np.ix_(positions[start:end], self.column_rows[postings])] += np.outer(
+                values[start:end], self.column_values[postings]
+            )
+        return scores
+
+
+def build_feature_matrix(products):
+    """Fills a FeatureMatrix from the per-group features of the products."""
+    rows, columns, values = [], [], []
+    width = 0
+    for group, features in _group_features(products):
+        vocabulary = {}
+        scale = math.sqrt(FEATURE_WEIGHTS[group])
+        for row, items in enumerate(features):
+            norm = math.sqrt(sum(weight * weight for _, weight in items))
+            for value, weight in items:
+                rows.append(row)
+                columns.append(width + vocabulary.setdefault(value, len(vocabulary)))
+                values.append(weight / norm * scale)
+        width += len(vocabulary)
+    return FeatureMatrix(len(products), rows, columns, values)
+
+
+def top_neighbours(matrix, rows, count):
+    """
+    The ``count`` most similar other products for the given matrix rows.
+
+    Yields:
+        tuple: (row, [(neighbour row, score), ...]) ordered by descending score.
+    """
+    count = min(count, len(matrix) - 1)
+    for start in range(0, len(rows), BLOCK_SIZE):
+        batch = np.asarray(rows[start:start + BLOCK_SIZE], dtype=np.intp)
+        scores = matrix.scores(batch)
+        scores[np.arange(len(batch)), batch] = -1
+        if count <= 0:
+            for row in batch:
+                yield int(row), []
+            continue
+        top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for row, neighbours, neighbour_scores in zip(batch, top, top_scores):
+            yield int(row), [
+                (int(neighbour), float(score)) for neighbour, score in zip(neighbours, neighbour_scores) if score > 0
+            ]
+
+
+def refresh_similar_products(full=False, count=None):
+    """
+    Recomputes the stored similar-product lists.
+
+    Products whose features changed since the last build (by fingerprint) get
+    new lists, and so do the lists they may affect: lists that contain a
+    changed or deactivated product and lists a changed product now scores high
+    enough to enter. ``full`` rebuilds everything, e.g. to pick up the drift of
+    title token weights as the catalog grows.
+
+    Returns:
+        int: Number of products whose lists were rewritten.
+    """
+    if np is None:
+        raise ImproperlyConfigured("NumPy is required to build similar products")
+    count = count or _setting('SIMILAR_PRODUCTS_COUNT', 12)
+
+    products = load_products()
+    index = {product['id']: row for row, product in enumerate(products)}
+    fingerprints = [fingerprint(product) for product in products]
+
+    stored = defaultdict(list)
+    for product_id, similar_id, score in SimilarProduct.objects.order_by(
+        'product_id', 'rank'
+    ).values_list('product_id', 'similar_id', 'score'):
+        stored[str(product_id)].append((str(similar_id), score))
+    # Деактивированные товары: их списки удаляются, а списки с ними пересчитываются
+    removed = {product_id for product_id in stored if product_id not in index}
+    removed |= {similar_id for links in stored.values() for similar_id, _ in links if similar_id not in index}
+
+    changed = [
+        row for row, product in enumerate(products)
+        if full or product['stored_fingerprint'] != fingerprints[row] or product['id'] not in stored
+    ]
+    if not changed and not removed:
+        return 0
+
+    matrix = build_feature_matrix(products)
+    targets = set(changed)
+    changed_ids = {products[row]['id'] for row in changed} | removed
+    for product_id, links in stored.items():
+        if product_id in index and any(similar_id in changed_ids for similar_id, _ in links):
+            targets.add(index[product_id])
+
+    if not full and changed:
+        # Порог входа в список — score последнего соседа; в неполный список проходит любой
+        threshold = np.zeros(len(products), dtype=np.float32)
+        for product_id, links in stored.items():
+            if product_id in index and len(links) >= count:
+                threshold[index[product_id]] = links[-1][1]
+        for start in range(0, len(changed), BLOCK_SIZE):
+            scores = matrix.scores(changed[start:start + BLOCK_SIZE])
+            targets.update(np.nonzero((scores > threshold).any(axis=0))[0].tolist())
+
+    links = [
+        SimilarProduct(product_id=products[row]['id'], similar_id=products[neighbour]['id'], rank=rank, score=score)
+        for row, neighbours in top_neighbours(matrix, sorted(targets), count)
+        for rank, (neighbour, score) in enumerate(neighbours)
+    ]
+    target_ids = [products[row]['id'] for row in targets] + list(removed)
+    with transaction.atomic():
+        for start in range(0, len(target_ids), 500):
+            SimilarProduct.objects.filter(product_id__in=target_ids[start:start + 500]).delete()
+        SimilarProduct.objects.bulk_create(links, batch_size=1000)
+        Product.objects.bulk_update(
+            [Product(pk=products[row]['id'], similar_fingerprint=fingerprints[row]) for row in changed],
+            ['similar_fingerprint'],
+            batch_size=500
+        )
+    return len(targets)
@@ -0,0 +1,78 @@
+# singleflight.py
+import asyncio
+import threading
+
+
+def query_key(query_params):
+    """Ключ запроса, не зависящий от порядка параметров"""
+    return tuple(sorted((name, tuple(values)) for name, values in query_params.lists()))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls within a process: the first caller
+    computes the value, callers arriving meanwhile wait and share it.
+    Nothing is kept after the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """То же для корутин одного event loop"""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, factory):
+        task = self._calls.get(key)
+        if task is None:
+            # Расчёт идёт отдельной задачей: отмена любого клиента, в том числе первого,
+            # не прерывает его для остальных
+            task = self._calls[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Помечаем исключение полученным, если все ждущие отменились
+        if not task.cancelled():
+            task.exception()
+
+
+flight = SingleFlight()
+async_flight = AsyncSingleFlight()
@@ -0,0 +1,92 @@
+# size_summary.py
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max, Min, Sum
+
+from .models import ModelSize, Product, ProductModel
+
+
+def price_decimal(value):
+    """Цена из сводки обратно в Decimal с двумя знаками"""
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def build_size_summaries(product_ids):
+    """
+    Aggregates distinct sizes per product in one grouped query.
+
+    Returns:
+        dict: product id -> [{'size', 'price', 'stock'}] sorted by size.
+    """
+    summaries = {product_id: [] for product_id in product_ids}
+    rows = ModelSize.objects.filter(
+        model__product_id__in=product_ids,
+        model__is_active=True,
+    ).values('model__product_id', 'size').annotate(
+        min_price=Min('price'),
+        max_price=Max('price'),
+        total_stock=Sum('stock'),
+    ).order_by('model__product_id', 'size')
+
+    for row in rows:
+        summaries[row['model__product_id']].append({
+            # Числа, как прежде отдавал API (JSONEncoder DRF пишет Decimal как float): 42.5, 100.0
+            'size': float(row['size']),
+            'price': float(row['min_price']),
+            'stock': row['total_stock'],
+            'max_price': float(row['max_price']),
+        })
+    return summaries
+
+
+def refresh_size_summaries(product_ids, batch_size=500):
+    """Пересчитывает Product.size_summary и диапазон цен для указанных товаров"""
+    product_ids = list(set(product_ids))
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        products = []
+        for product_id, summary in build_size_summaries(batch).items():
+            max_prices = [price_decimal(entry.pop('max_price')) for entry in summary]
+            products.append(Product(
+                pk=product_id,
+                size_summary=summary,
+                min_price=min((price_decimal(entry['price']) for entry in summary), default=None),
+                max_price=max(max_prices, default=None),
+            ))
+        Product.objects.bulk_update(products, ['size_summary', 'min_price', 'max_price'])
+
+
+def _pending_ids(using):
+    # Накопленные id принадлежат внешнему atomic-блоку: после отката транзакции новая начинает с пустых
+    connection = transaction.get_connection(using)
+    block = connection.atomic_blocks[0] if connection.atomic_blocks else None
+    pending = getattr(connection, '_size_summary_pending', None)
+    if pending is None or pending[0] is not block:
+        pending = connection._size_summary_pending = (block, set(), set())
+    return pending[1], pending[2]
+
+
+def _flush_pending(pending_products, pending_models, using):
+    if not pending_products and not pending_models:
+        # Сводки уже пересчитаны обработчиком, зарегистрированным раньше в этой транзакции
+        return
+    product_ids, model_ids = set(pending_products), set(pending_models)
+    pending_products.clear()
+    pending_models.clear()
+    if model_ids:
+        product_ids.update(
+            ProductModel.objects.using(using).filter(pk__in=model_ids).values_list('product_id', flat=True)
+        )
+    refresh_size_summaries(product_ids)
+
+
+def schedule_size_summary_refresh(product_ids=(), model_ids=(), using=None):
+    """Пересчитывает сводки после фиксации транзакции, каждый товар — один раз за транзакцию"""
+    using = using or DEFAULT_DB_ALIAS
+    pending_products, pending_models = _pending_ids(using)
+    pending_products.update(product_ids)
+    pending_models.update(model_ids)
+    # Обработчик регистрируется на каждое изменение: при откате точки сохранения Django
+    # отбрасывает её обработчики, а первый уцелевший забирает все накопленные id
+    transaction.on_commit(lambda: _flush_pending(pending_products, pending_models, using), using=using)
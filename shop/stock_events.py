@@ -0,0 +1,195 @@
+# stock_events.py
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Канал PostgreSQL LISTEN/NOTIFY для изменений остатков и цен
+NOTIFY_CHANNEL = 'shop_stock'
+# Лимит payload у NOTIFY — 8000 байт, оставляем запас
+NOTIFY_PAYLOAD_LIMIT = 7500
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def stock_event(model_size, product_id, sku, deleted=False):
+    return {
+        'product_id': str(product_id),
+        'model_id': str(model_size.model_id),
+        'sku': sku,
+        'size': str(Decimal(model_size.size).quantize(Decimal('0.1'))),
+        'price': str(Decimal(model_size.price).quantize(Decimal('0.01'))),
+        'stock': 0 if deleted else model_size.stock,
+    }
+
+
+def use_postgres_notify():
+    backend = _setting('STOCK_EVENTS_BACKEND', 'auto')
+    if backend == 'auto':
+        return connection.vendor == 'postgresql'
+    return backend == 'postgres'
+
+
+class Subscription:
+    """
+    One SSE client: the products it follows and a bounded buffer of pending
+    events. Events for the same size overwrite each other, so a slow client
+    only gets the latest state; on overflow the buffer is dropped and the
+    client is told to resync.
+    """
+
+    def __init__(self, product_ids, max_buffer):
+        self.product_ids = frozenset(product_ids)
+        self.max_buffer = max_buffer
+        self.pending = {}
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def push(self, event):
+        if self.overflowed:
+            return
+        key = (event['model_id'], event['size'])
+        if key not in self.pending and len(self.pending) >= self.max_buffer:
+            self.overflowed = True
+            self.pending.clear()
+        else:
+            self.pending[key] = event
+        self.ready.set()
+
+    def drain(self):
+        events, overflowed = list(self.pending.values()), self.overflowed
+        self.pending = {}
+        self.overflowed = False
+        self.ready.clear()
+        return events, overflowed
+
+
+class StockBroadcaster:
+    """
+    In-process fan-out of stock events to SSE subscriptions.
+
+    Subscriptions live on the server's event loop; ``publish`` may be called
+    from any thread. An idle subscriber costs one small buffer and one
+    waiting coroutine.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._by_product = defaultdict(set)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, product_ids):
+        self._loop = asyncio.get_running_loop()
+        if use_postgres_notify():
+            self._start_listener()
+        subscription = Subscription(product_ids, _setting('STOCK_EVENTS_BUFFER_SIZE', 256))
+        for product_id in subscription.product_ids:
+            self._by_product[product_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for product_id in subscription.product_ids:
+            subscriptions = self._by_product.get(product_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._by_product[product_id]
+
+    def publish(self, events):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch, events)
+
+    def _dispatch(self, events):
+        for event in events:
+            for subscription in self._by_product.get(event['product_id'], ()):
+                subscription.push(event)
+
+    def _start_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='stock-events-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        # Отдельное соединение psycopg2 в autocommit: LISTEN не должен жить в транзакции запроса
+        import psycopg2
+        import psycopg2.extensions
+
+        while True:
+            listen_connection = None
+            try:
+                listen_connection = psycopg2.connect(**connection.get_connection_params())
+                listen_connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with listen_connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+                while True:
+                    if select.select([listen_connection], [], [], 30) == ([], [], []):
+                        continue
+                    listen_connection.poll()
+                    while listen_connection.notifies:
+                        notify = listen_connection.notifies.pop(0)
+                        self.publish(json.loads(notify.payload))
+            except Exception:
+                logger.exception("Stock events listener error, reconnecting in 5s")
+                time.sleep(5)
+            finally:
+                if listen_connection is not None:
+                    listen_connection.close()
+
+
+broadcaster = StockBroadcaster()
+
+
+def _notify_payloads(events):
+    # Несколько событий в одном NOTIFY, каждый payload в пределах лимита
+    batch = []
+    size = 2
+    for event in events:
+        data = json.dumps(event, cls=DjangoJSONEncoder)
+        if batch and size + len(data) + 1 > NOTIFY_PAYLOAD_LIMIT:
+            yield '[' + ','.join(batch) + ']'
+            batch = []
+            size = 2
+        batch.append(data)
+        size += len(data) + 1
+    if batch:
+        yield '[' + ','.join(batch) + ']'
+
+
+def publish_stock_changes(events):
+    """
+    Sends stock/price events to SSE subscribers of all processes (PostgreSQL
+    NOTIFY) or of the current process (in-process broadcast).
+
+    Call it after the transaction has committed.
+    """
+    if not events or not _setting('STOCK_EVENTS_ENABLED', True):
+        return
+    if not use_postgres_notify():
+        broadcaster.publish(events)
+        return
+    try:
+        with connection.cursor() as cursor:
+            for payload in _notify_payloads(events):
+                cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, payload])
+    except Exception:
+        logger.exception("Error publishing stock events")
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))}\n\n"
@@ -0,0 +1,237 @@
+import uuid
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .async_views import StockStreamView
+from .catalog_import import import_stock
+from .db_router import PRIMARY_PIN_COOKIE, PRIMARY_PIN_HEADER, ReadReplicaRouter, ReplicaRoutingMiddleware
+from .models import Brand, Category, ModelSize, Product, ProductModel
+from . import size_summary
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Changelists run the same number of queries for 10 and 100 rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.brand = Brand.objects.create(name='Nike', slug='nike')
+        cls.root = Category.objects.create(name='Shoes', slug='shoes')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.created = 0
+
+    def create_catalog(self, count):
+        for index in range(self.created, self.created + count):
+            category = Category.objects.create(name=f'Category {index}', slug=f'category-{index}', parent=self.root)
+            product = Product.objects.create(title=f'Product {index}', slug=f'product-{index}', brand=self.brand)
+            product.categories.add(category)
+            model = ProductModel.objects.create(product=product, color='black', sku=f'SKU-{index}')
+            for size in ('40', '41', '42.5'):
+                ModelSize.objects.create(model=model, size=size, price=100 + index, stock=index % 3)
+        self.created += count
+
+    def assertConstantQueries(self, url):
+        self.create_catalog(10)
+        # Первый запрос заполняет кеши (ContentType, сессия), его не считаем
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+
+        self.create_catalog(90)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(len(response.context['cl'].result_list), 100)
+
+    def test_product_changelist(self):
+        self.assertConstantQueries('/admin/shop/product/')
+
+    def test_product_model_changelist(self):
+        self.assertConstantQueries('/admin/shop/productmodel/')
+
+    def test_product_model_changelist_sorted_by_stock(self):
+        self.assertConstantQueries('/admin/shop/productmodel/?o=6')
+
+    def test_model_size_changelist(self):
+        self.assertConstantQueries('/admin/shop/modelsize/')
+
+    def test_category_changelist(self):
+        self.assertConstantQueries('/admin/shop/category/')
+
+
+class CatalogImportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(title='Product', slug='product')
+        cls.model = ProductModel.objects.create(product=product, color='black', sku='SKU-1')
+        ModelSize.objects.create(model=cls.model, size='40', price=100, stock=1)
+
+    def test_invalid_stock_is_a_row_error(self):
+        rows = [{'sku': 'SKU-1', 'size': '40', 'stock': stock} for stock in ('inf', '-inf', 'nan', '1e400', '1.5', 'x')]
+        report = import_stock(rows)
+        self.assertEqual([line for line, _ in report.errors], [2, 3, 4, 5, 6, 7])
+        self.assertEqual(ModelSize.objects.get(model=self.model, size='40').stock, 1)
+
+    def test_integral_stock_is_accepted(self):
+        report = import_stock([{'sku': 'SKU-1', 'size': '40', 'stock': '3.0'}, {'sku': 'SKU-1', 'size': '40', 'stock': 4}])
+        self.assertEqual(report.errors, [])
+        self.assertEqual(ModelSize.objects.get(model=self.model, size='40').stock, 4)
+
+    def test_new_size_without_price_is_a_row_error(self):
+        report = import_stock([{'sku': 'SKU-1', 'size': '41', 'stock': '2'}])
+        self.assertEqual(len(report.errors), 1)
+        self.assertFalse(ModelSize.objects.filter(model=self.model, size='41').exists())
+
+    def test_dry_run_matches_real_run_across_batches(self):
+        rows = [
+            {'sku': 'SKU-1', 'size': '41', 'price': '120', 'stock': '2'},
+            {'sku': 'SKU-1', 'size': '41', 'stock': '5'},
+            {'sku': 'SKU-1', 'size': '40', 'stock': '7'},
+            {'sku': 'SKU-1', 'size': '40', 'stock': '7'},
+        ]
+        dry_run = import_stock(rows, batch_size=1, dry_run=True)
+        self.assertFalse(ModelSize.objects.filter(model=self.model, size='41').exists())
+        real_run = import_stock(rows, batch_size=1)
+        counters = ('created', 'updated', 'unchanged')
+        self.assertEqual(
+            [getattr(dry_run, counter) for counter in counters],
+            [getattr(real_run, counter) for counter in counters]
+        )
+        self.assertEqual([real_run.created, real_run.updated, real_run.unchanged], [1, 2, 1])
+
+
+class SizeSummarySignalTest(TestCase):
+    def test_product_is_refreshed_once_per_transaction(self):
+        product = Product.objects.create(title='Product', slug='product')
+        with mock.patch.object(size_summary, 'refresh_size_summaries', wraps=size_summary.refresh_size_summaries) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    model = ProductModel.objects.create(product=product, color='black', sku='SKU-1')
+                    for size in ('40', '41', '42'):
+                        ModelSize.objects.create(model=model, size=size, price=100, stock=1)
+                    ModelSize.objects.filter(model=model, size='42').get().delete()
+                refresh.assert_not_called()
+
+        refresh.assert_called_once_with({product.pk})
+        product.refresh_from_db()
+        self.assertEqual([entry['size'] for entry in product.size_summary], [40.0, 41.0])
+
+    def test_rolled_back_transaction_does_not_lose_later_refresh(self):
+        product = Product.objects.create(title='Product', slug='product')
+        model = ProductModel.objects.create(product=product, color='black', sku='SKU-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    ModelSize.objects.create(model=model, size='40', price=100, stock=1)
+                    raise ValueError
+            except ValueError:
+                pass
+            ModelSize.objects.create(model=model, size='41', price=120, stock=2)
+
+        product.refresh_from_db()
+        self.assertEqual([entry['size'] for entry in product.size_summary], [41.0])
+        self.assertEqual(product.min_price, 120)
+
+
+class ReplicaRoutingTest(SimpleTestCase):
+    replicas = ('replica_1', 'replica_2')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Реплики — ещё два соединения с тестовой базой, как при TEST MIRROR. Алиасы добавляются
+        # после проверок тест-раннера, которые требуют их в настройках, поэтому их нет в databases
+        for alias in cls.replicas:
+            connections.settings[alias] = {**connections.settings['default'], 'TEST': {'MIRROR': 'default'}}
+        cls.addClassCleanup(cls.remove_replicas)
+
+    @classmethod
+    def remove_replicas(cls):
+        for alias in cls.replicas:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+    def setUp(self):
+        with self.settings(DATABASE_REPLICAS=list(self.replicas)):
+            self.router = ReadReplicaRouter()
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(self.view)
+        self.routed = []
+
+    def view(self, request):
+        self.routed.append([self.router.db_for_read(Product) for _ in range(3)])
+        return HttpResponse()
+
+    def test_request_keeps_one_replica(self):
+        self.middleware(self.factory.get('/api/products/'))
+        self.middleware(self.factory.get('/api/products/'))
+        first, second = self.routed
+        self.assertEqual(first, [first[0]] * 3)
+        self.assertEqual(second, [second[0]] * 3)
+        self.assertEqual({first[0], second[0]}, set(self.replicas))
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.assertEqual(self.router.db_for_write(Product), 'default')
+
+    def test_admin_and_writes_use_primary(self):
+        self.middleware(self.factory.get('/admin/shop/product/'))
+        self.middleware(self.factory.post('/api/orders/validate/'))
+        self.assertEqual(self.routed, [['default'] * 3] * 2)
+
+    def test_write_pins_client_to_primary(self):
+        response = self.middleware(self.factory.post('/api/orders/validate/'))
+        cookie = response.cookies[PRIMARY_PIN_COOKIE]
+        self.assertEqual(cookie['samesite'], 'None')
+        self.assertTrue(cookie['secure'])
+        self.assertEqual(response[PRIMARY_PIN_HEADER], str(settings.DATABASE_REPLICA_PIN_SECONDS))
+
+        self.routed = []
+        request = self.factory.get('/api/products/')
+        request.COOKIES[PRIMARY_PIN_COOKIE] = '1'
+        self.middleware(request)
+        self.middleware(self.factory.get('/api/products/', HTTP_X_DB_PIN_PRIMARY=response[PRIMARY_PIN_HEADER]))
+        self.assertEqual(self.routed, [['default'] * 3] * 2)
+
+    def test_unavailable_replica_is_skipped(self):
+        with mock.patch.object(connections['replica_1'], 'ensure_connection', side_effect=DatabaseError):
+            for _ in range(3):
+                self.middleware(self.factory.get('/api/products/'))
+        self.assertEqual(self.routed, [['replica_2'] * 3] * 3)
+
+
+@override_settings(STOCK_EVENTS_MAX_STREAMS=1, STOCK_EVENTS_MAX_STREAM_SECONDS=0)
+class StockStreamLimitTest(TestCase):
+    def setUp(self):
+        self.view = StockStreamView.as_view()
+        self.factory = AsyncRequestFactory()
+        self.url = f'/api/stock/stream/?products={uuid.uuid4()}'
+
+    async def test_streams_above_limit_get_503(self):
+        first = await self.view(self.factory.get(self.url))
+        self.assertEqual(first.status_code, 200)
+        second = await self.view(self.factory.get(self.url))
+        self.assertEqual(second.status_code, 503)
+        self.assertIn('Retry-After', second)
+
+        # Поток с нулевым сроком жизни закрывается после snapshot и освобождает место
+        chunks = [chunk async for chunk in first.streaming_content]
+        self.assertIn(b'event: snapshot', b''.join(chunks))
+        self.assertEqual(StockStreamView.open_streams, 0)
+        third = await self.view(self.factory.get(self.url))
+        self.assertEqual(third.status_code, 200)
+        [chunk async for chunk in third.streaming_content]
+
+    async def test_throttled_client_gets_429(self):
+        with mock.patch.object(StockStreamView, 'check_throttles', return_value=10):
+            response = await self.view(self.factory.get(self.url))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '11')
+        self.assertEqual(StockStreamView.open_streams, 0)
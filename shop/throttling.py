@@ -0,0 +1,70 @@
+# throttling.py
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import parse_qsl
+
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+# Заголовок, в котором WebApp передаёт Telegram.WebApp.initData
+INIT_DATA_HEADER = 'HTTP_X_TELEGRAM_INIT_DATA'
+
+
+def validate_init_data(init_data, bot_token, max_age):
+    """
+    Checks the WebApp initData signature.
+
+    Returns:
+        int: Telegram user id, or None if the data is missing, forged or expired.
+    """
+    data = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = data.pop('hash', '')
+    data_check_string = '\n'.join(f'{key}={value}' for key, value in sorted(data.items()))
+    secret_key = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    expected_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        return None
+    try:
+        if max_age and time.time() - int(data.get('auth_date', 0)) > max_age:
+            return None
+        return int(json.loads(data.get('user', '{}'))['id'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def telegram_user_id(request):
+    """Telegram id пользователя WebApp из подписанного initData (результат запоминается на запросе)"""
+    if not hasattr(request, '_telegram_user_id'):
+        init_data = request.META.get(INIT_DATA_HEADER)
+        bot_token = getattr(settings, 'TELEGRAM_BOT_TOKEN', '')
+        request._telegram_user_id = validate_init_data(
+            init_data,
+            bot_token,
+            getattr(settings, 'TELEGRAM_INIT_DATA_MAX_AGE', 86400)
+        ) if init_data and bot_token else None
+    return request._telegram_user_id
+
+
+class TelegramUserRateThrottle(SimpleRateThrottle):
+    """
+    Limits requests per Telegram user; clients without valid initData are
+    limited per IP address.
+    """
+
+    def get_cache_key(self, request, view):
+        user_id = telegram_user_id(request)
+        ident = f'tg{user_id}' if user_id is not None else self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class CatalogBurstThrottle(TelegramUserRateThrottle):
+    scope = 'catalog_burst'
+
+
+class CatalogSustainedThrottle(TelegramUserRateThrottle):
+    scope = 'catalog_sustained'
+
+
+CATALOG_THROTTLES = (CatalogBurstThrottle, CatalogSustainedThrottle)
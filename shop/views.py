@@ -1,22 +1,223 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
 from django.db.models import Q, Prefetch
 from django.db.models.functions import Lower
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import viewsets
+from rest_framework.permissions import IsAdminUser
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from .catalog_cache import PRODUCT, cache_enabled, get_or_build, get_or_build_products, listing_cache_entry
+from .catalog_export import EXPORT_FORMATS, aiter_sync, export_catalog
+from .db_backend.base import metrics as db_metrics
+from .fieldsets import FieldSet
 from .models import *
+from .orders import validate_order
+from .pagination import KeysetPagination
+from .permissions import HasServiceToken
+from .popularity import record_order_lines, record_view
 from .serializers import *
+from .singleflight import flight, query_key
+from .throttling import CATALOG_THROTTLES
 
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.filter(is_active=True).select_related('parent')
     serializer_class = CategorySerializer
+    throttle_classes = CATALOG_THROTTLES
 
     def get_queryset(self):
         return self.queryset.order_by('tree_id', 'lft')
 
 
+# Сколько товаров или артикулов можно запросить одним batch-запросом
+BATCH_MAX_ITEMS = 100
+
+
+def _list_param(query_params, name):
+    # Поддерживаются и ?ids=a,b, и ?ids=a&ids=b
+    values = [value.strip() for param in query_params.getlist(name) for value in param.split(',')]
+    return list(dict.fromkeys(value for value in values if value))
+
+
+def _decimal_param(query_params, name):
+    try:
+        value = Decimal(query_params[name])
+    except (KeyError, InvalidOperation):
+        return None
+    return value if value.is_finite() else None
+
+
+def filter_products(queryset, query_params):
+    """
+    Применяет фильтры и сортировку каталога из параметров запроса.
+
+    Сортировка по цене (ordering=price / -price) показывает только товары с ценой:
+    товары без активных размеров (min_price NULL) в неё не попадают.
+    """
+    category_slug = query_params.get('category')
+
+    search_query = query_params.get('search')  # Новый параметр поиска
+    sort = query_params.get('ordering', 'default')
+
+    has_filters = (
+            category_slug is not None or
+            search_query is not None or
+            bool(query_params.getlist('brand')) or
+            bool(query_params.getlist('size')) or
+            'in_stock' in query_params or
+            'min_price' in query_params or
+            'max_price' in query_params or
+            'new_days' in query_params
+    )
+
+    # Фильтрация по поисковому запросу
+    if search_query:
+        queryset = queryset.filter(
+            Q(title__icontains=search_query) |
+            Q(description__icontains=search_query)
+        )
+
+    if category_slug:
+        try:
+            category = Category.objects.get(slug=category_slug, is_active=True)
+            descendants = category.get_descendants(include_self=True)
+            queryset = queryset.filter(
+                productcategory__category__in=descendants
+            ).distinct()
+        except Category.DoesNotExist:
+            return queryset.none()
+
+    brands = query_params.getlist('brand')
+    if brands:
+        queryset = queryset.filter(brand__slug__in=brands)
+
+    # Фильтрация по размерам
+    sizes = query_params.getlist('size')
+    # Фильтрация по наличию
+    in_stock = query_params.get('in_stock') == 'true'
+
+    # Если выбраны размеры И фильтр "В наличии"
+    if sizes and in_stock:
+        try:
+            sizes_float = [float(size) for size in sizes]
+            # Фильтруем по выбранным размерам и наличию именно этих размеров
+            queryset = queryset.filter(
+                models__sizes__size__in=sizes_float,
+                models__sizes__stock__gt=0
+            ).distinct()
+        except ValueError:
+            pass
+    # Если выбраны только размеры (без фильтра наличия)
+    elif sizes:
+        try:
+            sizes_float = [float(size) for size in sizes]
+            queryset = queryset.filter(
+                models__sizes__size__in=sizes_float
+            ).distinct()
+        except ValueError:
+            pass
+    # Если выбран только фильтр "В наличии" (без конкретных размеров)
+    elif in_stock:
+        # Фильтруем товары с любым размером в наличии
+        queryset = queryset.filter(
+            models__sizes__stock__gt=0
+        ).distinct()
+
+    # Диапазон цен по денормализованным min_price/max_price товара:
+    # подходит товар, у которого есть размеры с ценой, пересекающейся с диапазоном
+    min_price = _decimal_param(query_params, 'min_price')
+    if min_price is not None:
+        queryset = queryset.filter(max_price__gte=min_price)
+    max_price = _decimal_param(query_params, 'max_price')
+    if max_price is not None:
+        queryset = queryset.filter(min_price__lte=max_price)
+
+    # Новинки: товары, добавленные за последние N дней
+    try:
+        new_days = int(query_params['new_days'])
+        queryset = queryset.filter(created_at__gte=timezone.now() - timedelta(days=new_days))
+    except (KeyError, ValueError, OverflowError):
+        pass
+
+    if not has_filters and sort == 'default':
+        queryset = queryset.order_by('?')
+    else:
+        if sort == 'base_price':
+            queryset = queryset.order_by('base_price')
+        elif sort == '-base_price':
+            queryset = queryset.order_by('-base_price')
+        elif sort == 'price':
+            # id в конце сортировки делает ключ уникальным для keyset-пагинации.
+            # Товары без цены исключаются намеренно: NULL в ключе сломал бы сравнение строк
+            # (min_price, id) > (...) и диапазонное чтение индекса, а купить их всё равно нельзя
+            queryset = queryset.filter(min_price__isnull=False).order_by('min_price', 'id')
+        elif sort == '-price':
+            queryset = queryset.filter(min_price__isnull=False).order_by('-min_price', '-id')
+        elif sort in ('new', '-created_at'):
+            queryset = queryset.order_by('-created_at', '-id')
+        elif sort == 'created_at':
+            queryset = queryset.order_by('created_at', 'id')
+        elif sort == 'trending':
+            # Popularity пересчитывается периодически (shop.popularity), сортировка идёт по индексу
+            queryset = queryset.order_by('-popularity', '-id')
+        elif sort == 'title':
+            queryset = queryset.annotate(lower_title=Lower('title')).order_by('lower_title')
+        elif sort == 'default':
+            queryset = queryset.order_by('id')
+
+    return queryset
+
+
+def product_prefetches():
+    return (
+        Prefetch('models', queryset=ProductModel.objects.filter(is_active=True).prefetch_related(
+            'sizes',
+            'images'
+        )),
+        'brand',
+        'categories',
+    )
+
+
+def apply_product_fieldset(queryset, fieldset=None):
+    """
+    Loads only the relations and columns the requested fields will render.
+
+    Without a sparse fieldset every relation is prefetched as before.
+    """
+    if fieldset is None or fieldset.is_default:
+        return queryset.prefetch_related(*product_prefetches())
+
+    models = ProductModel.objects.filter(is_active=True)
+    if fieldset.wants('models') and fieldset.is_expanded('models'):
+        queryset = queryset.prefetch_related(Prefetch('models', queryset=models.prefetch_related('sizes', 'images')))
+    elif fieldset.wants('main_image'):
+        # Главное изображение ищется среди изображений моделей, если у товара нет своего
+        queryset = queryset.prefetch_related(Prefetch('models', queryset=models.prefetch_related('images')))
+    elif fieldset.wants('models'):
+        queryset = queryset.prefetch_related(Prefetch('models', queryset=models.only('id', 'product_id')))
+
+    if fieldset.wants('brand') and fieldset.is_expanded('brand'):
+        queryset = queryset.select_related('brand')
+    if fieldset.wants('categories'):
+        queryset = queryset.prefetch_related('categories')
+
+    deferred = [
+        column for column, field in (('description', 'description'), ('size_summary', 'available_sizes'))
+        if not fieldset.wants(field)
+    ]
+    return queryset.defer(*deferred) if deferred else queryset
+
+
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.filter(is_active=True)
+    pagination_class = KeysetPagination
+    throttle_classes = CATALOG_THROTTLES
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -24,92 +225,135 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         return ProductListSerializer
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        category_slug = self.request.query_params.get('category')
-
-        search_query = self.request.query_params.get('search')  # Новый параметр поиска
-        sort = self.request.query_params.get('ordering', 'default')
-
-        has_filters = (
-                category_slug is not None or
-                search_query is not None or
-                bool(self.request.query_params.getlist('brand')) or
-                bool(self.request.query_params.getlist('size')) or
-                'in_stock' in self.request.query_params
+        queryset = filter_products(super().get_queryset(), self.request.query_params)
+        return apply_product_fieldset(queryset, self.get_fieldset())
+
+    def get_fieldset(self):
+        # ?fields=id,title,main_image&expand=brand
+        return FieldSet.from_query_params(self.request.query_params, self.get_serializer_class().Meta.fields)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        # Списки по категории или бренду отдаются из кеша, который прогревается при изменениях каталога
+        entry = listing_cache_entry(request.query_params)
+        if entry is not None:
+            return Response(get_or_build(*entry))
+
+        # Одинаковые одновременные запросы в воркере выполняются один раз
+        list_products = super().list
+
+        def compute():
+            response = list_products(request, *args, **kwargs)
+            # Заголовки пагинации (X-Next-Cursor, Link); Content-Type выставит рендерер
+            return response.data, {name: value for name, value in response.items() if name != 'Content-Type'}
+
+        key = ('products', query_key(request.query_params))
+        data, headers = flight.do(key, compute)
+        return Response(data, headers=headers)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not cache_enabled() or not self.get_fieldset().is_default:
+            response = super().retrieve(request, *args, **kwargs)
+            # Товар найден, значит id корректен; счётчик ведётся по канонической записи UUID
+            record_view(uuid.UUID(str(kwargs[self.lookup_field])))
+            return response
+        try:
+            product_id = uuid.UUID(str(kwargs[self.lookup_field]))
+        except ValueError:
+            raise Http404
+        data = get_or_build(PRODUCT, str(product_id))
+        if data is None:
+            raise Http404
+        # Просмотр только увеличивает счётчик в памяти, в базу он попадёт пачкой
+        record_view(product_id)
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # Потоковая выгрузка каталога: ?output=jsonl|csv&gzip=1
+        export_format = request.query_params.get('output', 'jsonl')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'detail': f"Unknown output: {export_format}"}, status=400)
+        compress = request.query_params.get('gzip') in ('1', 'true')
+
+        content = export_catalog(
+            export_format,
+            base_url=request.build_absolute_uri('/').rstrip('/'),
+            compress=compress
         )
+        if settings.DEPLOYMENT_PROFILE == 'asgi':
+            # Под ASGI синхронный итератор был бы прочитан целиком
+            content = aiter_sync(content)
 
-        # Фильтрация по поисковому запросу
-        if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
-
-        if category_slug:
-            try:
-                category = Category.objects.get(slug=category_slug, is_active=True)
-                descendants = category.get_descendants(include_self=True)
-                queryset = queryset.filter(
-                    productcategory__category__in=descendants
-                ).distinct()
-            except Category.DoesNotExist:
-                return queryset.none()
-
-        brands = self.request.query_params.getlist('brand')
-        if brands:
-            queryset = queryset.filter(brand__slug__in=brands)
-
-        # Фильтрация по размерам
-        sizes = self.request.query_params.getlist('size')
-        # Фильтрация по наличию
-        in_stock = self.request.query_params.get('in_stock') == 'true'
-
-        # Если выбраны размеры И фильтр "В наличии"
-        if sizes and in_stock:
-            try:
-                sizes_float = [float(size) for size in sizes]
-                # Фильтруем по выбранным размерам и наличию именно этих размеров
-                queryset = queryset.filter(
-                    models__sizes__size__in=sizes_float,
-                    models__sizes__stock__gt=0
-                ).distinct()
-            except ValueError:
-                pass
-        # Если выбраны только размеры (без фильтра наличия)
-        elif sizes:
-            try:
-                sizes_float = [float(size) for size in sizes]
-                queryset = queryset.filter(
-                    models__sizes__size__in=sizes_float
-                ).distinct()
-            except ValueError:
-                pass
-        # Если выбран только фильтр "В наличии" (без конкретных размеров)
-        elif in_stock:
-            # Фильтруем товары с любым размером в наличии
-            queryset = queryset.filter(
-                models__sizes__stock__gt=0
-            ).distinct()
+        filename = f"catalog.{export_format}" + ('.gz' if compress else '')
+        response = StreamingHttpResponse(
+            content,
+            content_type='application/x-ndjson' if export_format == 'jsonl' else 'text/csv; charset=utf-8'
+        )
+        if compress:
+            response['Content-Type'] = 'application/gzip'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """
+        Many products or models in one request: ?ids=<uuid>,... returns product
+        cards, ?skus=<sku>,... returns models with their product_id. Results
+        keep the requested order; unknown or inactive items are omitted.
+        """
+        ids = _list_param(request.query_params, 'ids')
+        skus = _list_param(request.query_params, 'skus')
+        if bool(ids) == bool(skus):
+            return Response({'detail': "Pass either ids or skus."}, status=400)
+        if len(ids) + len(skus) > BATCH_MAX_ITEMS:
+            return Response({'detail': f"At most {BATCH_MAX_ITEMS} items per request."}, status=400)
 
-        if not has_filters and sort == 'default':
-            queryset = queryset.order_by('?')
+        if skus:
+            fieldset = FieldSet.from_query_params(request.query_params, ProductModelBatchSerializer.Meta.fields)
+            prefetches = ['images'] if fieldset.wants('images') else []
+            if fieldset.wants('sizes') or fieldset.wants('min_price') or fieldset.wants('max_price'):
+                prefetches.append('sizes')
+            models = list(ProductModel.objects.filter(
+                sku__in=skus,
+                is_active=True,
+                product__is_active=True
+            ).prefetch_related(*prefetches))
+            data = ProductModelBatchSerializer(models, many=True, context={'fieldset': fieldset}).data
+            by_sku = {product_model.sku: item for product_model, item in zip(models, data)}
+            return Response([by_sku[sku] for sku in skus if sku in by_sku])
+
+        try:
+            ids = [str(uuid.UUID(product_id)) for product_id in ids]
+        except ValueError:
+            return Response({'detail': "Invalid product id."}, status=400)
+
+        fieldset = FieldSet.from_query_params(request.query_params, ProductDetailSerializer.Meta.fields)
+        if cache_enabled() and fieldset.is_default:
+            # Карточки берутся из кеша одним запросом к нему, промахи собираются вместе
+            products = get_or_build_products(ids)
         else:
-            if sort == 'base_price':
-                queryset = queryset.order_by('base_price')
-            elif sort == '-base_price':
-                queryset = queryset.order_by('-base_price')
-            elif sort == 'title':
-                queryset = queryset.annotate(lower_title=Lower('title')).order_by('lower_title')
-            elif sort == 'default':
-                queryset = queryset.order_by('id')
-
-        return queryset.prefetch_related(
-            Prefetch('models', queryset=ProductModel.objects.filter(is_active=True).prefetch_related(
-                'sizes',
-                'images'
-            )),
-            'brand'
-        )
+            instances = list(apply_product_fieldset(self.queryset.filter(pk__in=ids), fieldset))
+            data = ProductDetailSerializer(instances, many=True, context={'fieldset': fieldset}).data
+            products = {str(product.pk): item for product, item in zip(instances, data)}
+        return Response([products[product_id] for product_id in ids if product_id in products])
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        # Списки рассчитываются заранее (build_similar_products), здесь один запрос по индексу (product, rank)
+        try:
+            product_id = uuid.UUID(str(pk))
+        except ValueError:
+            raise Http404
+        queryset = self.queryset.filter(similar_to__product_id=product_id).order_by('similar_to__rank')
+        products = list(apply_product_fieldset(queryset, self.get_fieldset()))
+        if not products and not self.queryset.filter(pk=product_id).exists():
+            raise Http404
+        return Response(self.get_serializer(products, many=True).data)
 
     @action(detail=True, methods=['get'])
     def models(self, request, pk=None):
@@ -121,4 +365,35 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
 class BrandViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Brand.objects.filter(is_active=True)
     serializer_class = BrandSerializer
-    pagination_class = None  # Отключаем пагинацию для брендов
\ No newline at end of file
+    pagination_class = None  # Отключаем пагинацию для брендов
+    throttle_classes = CATALOG_THROTTLES
+
+class OrderViewSet(viewsets.ViewSet):
+    @action(detail=False, methods=['post'], permission_classes=[HasServiceToken])
+    def validate(self, request):
+        # Проверяем и переоцениваем заказ по каталогу одним пакетным запросом.
+        # Ответ раскрывает остатки и цены, поэтому эндпоинт только для бота
+        serializer = OrderValidationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = validate_order(
+            serializer.validated_data['items'],
+            serializer.validated_data.get('totalAmount')
+        )
+        return Response(result)
+
+    @action(detail=False, methods=['post'], permission_classes=[HasServiceToken])
+    def record(self, request):
+        # Бот сообщает о принятом заказе: позиции учитываются в популярности товаров
+        serializer = OrderRecordSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        counted = record_order_lines(serializer.validated_data['items'])
+        return Response({'counted': counted}, status=202)
+
+
+class MetricsViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdminUser]
+
+    @action(detail=False, methods=['get'])
+    def db(self, request):
+        # Метрики постоянных соединений текущего процесса
+        return Response(db_metrics.snapshot(settings.DATABASE_MAX_CONNECTIONS_PER_PROCESS))
@@ -0,0 +1,89 @@
+# warmup.py
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Шаги последнего прогрева процесса: {шаг: мс}
+last_report = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def load_urlconf():
+    # URLconf импортирует views, serializers, async views и классы DRF из настроек
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+
+def check_connections():
+    # Проверяет доступность баз до первого запроса; соединения закрываются в конце прогрева
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def prime_cache():
+    from .catalog_cache import CATEGORY_LISTING, cache_enabled, get_or_build
+    from .models import Category
+
+    if not cache_enabled():
+        return
+    # Списки верхних категорий — первые запросы WebApp; в общем кеше это одно чтение
+    for slug in Category.objects.filter(is_active=True, parent__isnull=True).values_list('slug', flat=True):
+        get_or_build(CATEGORY_LISTING, slug)
+
+
+def _run_steps(steps, report):
+    try:
+        for name, step in steps:
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                logger.exception("Startup warmup step %s failed", name)
+            report[name] = round((time.perf_counter() - started) * 1000, 1)
+    finally:
+        # Соединения принадлежат потоку прогрева или мастеру gunicorn --preload, чей сокет
+        # унаследуют форкнутые воркеры; закрываем их в том же потоке, где они открыты
+        connections.close_all()
+
+
+def warmup(check_database=True):
+    """
+    Prepares a worker before it accepts traffic: loads the URLconf, checks
+    the database connections and primes the hot catalog cache entries.
+
+    Every connection opened by the steps is closed before returning, so the
+    hook is safe in a preloading master and in a helper thread under ASGI.
+    A failing step is logged and skipped; it never stops the worker.
+
+    Returns:
+        dict: Step name -> duration in milliseconds.
+    """
+    global last_report
+    steps = [('urlconf', load_urlconf)]
+    if check_database:
+        steps.append(('db', check_connections))
+    if _setting('STARTUP_WARMUP_CACHE', True):
+        steps.append(('cache', prime_cache))
+
+    report = {}
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        _run_steps(steps, report)
+    else:
+        # uvicorn импортирует приложение внутри цикла событий, где синхронный ORM запрещён
+        thread = threading.Thread(target=_run_steps, args=(steps, report), name='startup-warmup')
+        thread.start()
+        thread.join()
+    last_report = report
+    return report
@@ -1,29 +1,126 @@
 import asyncio
+import hmac
 import json
 import logging
-import traceback
-import re
+import multiprocessing
+import atexit
 import os
-import json
+import queue
+import secrets
+import time
 
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+import aiohttp
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import CommandStart
 from aiogram.types import WebAppInfo, ReplyKeyboardMarkup
+from aiohttp import web
+
+from order_messages import build_admin_message, build_user_message
 
-# Настройка расширенного логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("bot_activity.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("sneakerculture_bot")
 
+
+# Стандартные атрибуты LogRecord; всё остальное считается структурированными полями
+_STANDARD_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonLogFormatter(logging.Formatter):
+    """
+    Formats log records as one JSON object per line.
+
+    Fields passed through ``extra`` (order_id, user_id, latency_ms, ...) are added
+    to the object as-is.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class ContextLogAdapter(logging.LoggerAdapter):
+    """LoggerAdapter that merges its context with the ``extra`` of each call."""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+
+_log_listener = None
+_log_listener_pid = None
+
+
+def setup_logging(log_file_path: str, level: str = "DEBUG") -> QueueListener:
+    """
+    Routes all log records through a queue so file and console I/O happen in a
+    background thread instead of the event loop.
+
+    Must be called in every process (webhook workers included): the listener
+    thread does not survive fork.
+
+    Args:
+        log_file_path (str): Daily JSON log file.
+        level (str): Level of the bot logger.
+
+    Returns:
+        QueueListener: The started listener.
+    """
+    global _log_listener, _log_listener_pid
+    if _log_listener is not None:
+        if _log_listener_pid == os.getpid():
+            return _log_listener
+        _log_listener = None
+
+    log_dir = os.path.dirname(log_file_path)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    # Ежедневный файл логов в формате JSON
+    file_handler = TimedRotatingFileHandler(
+        filename=log_file_path,
+        when="midnight",
+        interval=1,
+        backupCount=7,  # храним 7 последних логов
+        encoding="utf-8",
+        utc=False
+    )
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(JsonLogFormatter())
+
+    # Логирование в консоль
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(logging.INFO)
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    # Очищаем дубли
+    root_logger.handlers.clear()
+    root_logger.addHandler(QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+    logger.setLevel(level)
+
+    _log_listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _log_listener.start()
+    _log_listener_pid = os.getpid()
+    atexit.register(_log_listener.stop)
+    return _log_listener
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-BOT_SETTINGS_PATH = os.path.join(SCRIPT_DIR, "bot_settings.json")
+# Путь можно переопределить (тесты, несколько ботов на одном сервере)
+BOT_SETTINGS_PATH = os.environ.get("BOT_SETTINGS_PATH", os.path.join(SCRIPT_DIR, "bot_settings.json"))
 with open(BOT_SETTINGS_PATH, "r", encoding="utf-8") as f:
     config = json.load(f)
 
@@ -31,97 +128,156 @@ API_TOKEN = config["API_TOKEN"]
 WEBAPP_URL = config["WEBAPP_URL"]
 ADMIN_CHAT_ID = config["ADMIN_CHAT_ID"]
 MANAGER_CHAT_ID = config["MANAGER_CHAT_ID"]
+# API магазина для серверной проверки заказа (необязательно)
+SHOP_API_URL = config.get("SHOP_API_URL")
+ORDER_VALIDATION_TIMEOUT = config.get("ORDER_VALIDATION_TIMEOUT", 3)
+# Токен для проверки заказов и сообщения о принятых заказах (SHOP_SERVICE_TOKEN в настройках Django)
+SHOP_SERVICE_TOKEN = config.get("SHOP_SERVICE_TOKEN")
+LOG_LEVEL = config.get("LOG_LEVEL", "DEBUG")
+# Режим получения обновлений: "polling" или "webhook"
+BOT_MODE = config.get("MODE", "polling")
+WEBHOOK_SETTINGS = {
+    "url": None,
+    "path": "/webhook",
+    "host": "0.0.0.0",
+    "port": 8080,
+    "secret_token": None,
+    "max_concurrency": 100,
+    "shutdown_timeout": 30,
+    "workers": 1,
+    **config.get("WEBHOOK", {}),
+}
 
 bot = Bot(token=API_TOKEN)
 dp = Dispatcher()
 
 
-class MarkdownV2Escaper:
+_http_session = None
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Возвращает общую HTTP-сессию для запросов к API магазина"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=ORDER_VALIDATION_TIMEOUT)
+        )
+    return _http_session
+
+
+async def close_http_session():
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+
+
+async def validate_order_items(items: list, total_amount):
     """
-    A class to escape text for Telegram MarkdownV2 formatting.
-    It ensures that only characters outside MarkdownV2 syntax are escaped.
+    Validates and reprices order lines through the shop API.
+
+    Args:
+        items (list): Order lines from the WebApp payload.
+        total_amount: Total amount calculated by the WebApp.
+
+    Returns:
+        dict | None: Validation result, or None if the API is not configured or unavailable.
+    """
+    if not SHOP_API_URL or not SHOP_SERVICE_TOKEN:
+        return None
+
+    payload = {
+        'items': [
+            {
+                'sku': item.get('sku'),
+                'size': item.get('size'),
+                'quantity': item.get('quantity'),
+                'price': item.get('price'),
+            }
+            for item in items
+        ],
+        'totalAmount': total_amount,
+    }
+    url = f"{SHOP_API_URL.rstrip('/')}/orders/validate/"
+    try:
+        session = await get_http_session()
+        async with session.post(url, json=payload, headers={'X-Service-Token': SHOP_SERVICE_TOKEN}) as response:
+            if response.status != 200:
+                logger.warning("Order validation failed with status %s: %s", response.status, await response.text())
+                return None
+            return await response.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning("Order validation unavailable: %s", e)
+        return None
+
+
+async def record_order_items(items: list) -> bool:
     """
+    Reports an accepted order to the shop API for product popularity.
+
+    Returns:
+        bool: True if the shop accepted the order lines.
+    """
+    if not SHOP_API_URL or not SHOP_SERVICE_TOKEN:
+        return False
+
+    payload = {
+        'items': [
+            {'sku': item.get('sku'), 'size': item.get('size'), 'quantity': item.get('quantity')}
+            for item in items
+        ],
+    }
+    url = f"{SHOP_API_URL.rstrip('/')}/orders/record/"
+    try:
+        session = await get_http_session()
+        async with session.post(url, json=payload, headers={'X-Service-Token': SHOP_SERVICE_TOKEN}) as response:
+            if response.status != 202:
+                logger.warning("Order recording failed with status %s: %s", response.status, await response.text())
+                return False
+            return True
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning("Order recording unavailable: %s", e)
+        return False
+
+
+def apply_order_validation(items: list, validation: dict):
+    """
+    Replaces client prices with catalog prices and collects warnings for the admin.
+
+    Returns:
+        tuple: (repriced items, server total amount, list of warnings)
+    """
+    repriced = []
+    warnings = []
+    for item, line in zip(items, validation['items']):
+        item = dict(item)
+        label = f"{item.get('title', line['sku'])} ({line['sku']}), размер {line['size']}"
+        if line['status'] == 'unknown':
+            warnings.append(f"{label}: не найден в каталоге")
+        else:
+            item['title'] = line['title']
+            item['color'] = line['color']
+            item['price'] = line['price']
+            if line['status'] == 'out_of_stock':
+                warnings.append(f"{label}: нет в наличии")
+            elif line['status'] == 'insufficient_stock':
+                warnings.append(f"{label}: в наличии {line['stock']} шт из {line['quantity']}")
+            if line['price_changed']:
+                warnings.append(f"{label}: цена изменена {line['client_price']} → {line['price']}")
+        repriced.append(item)
+
+    if validation['total_mismatch']:
+        warnings.append(f"Сумма клиента {validation['client_total']} ≠ сумма по каталогу {validation['total_amount']}")
+
+    return repriced, validation['total_amount'], warnings
 
-    def __init__(self):
-        # Define special characters that need to be escaped in MarkdownV2
-        self.special_chars = r'_*\[\]()~`>#+-=|{}.!'
-
-        # Compile regex patterns for MarkdownV2 elements
-        self.markdown_patterns = [
-            r'\*[^*]+\*',  # Bold
-            r'_[^_]+_',  # Italic
-            r'__[^_]+__',  # Underline
-            r'~[^~]+~',  # Strikethrough
-            r'\|\|[^|]+\|\|',  # Spoiler
-            r'\[([^\]]+)\]\(([^)]+)\)',  # Inline URL
-            r'`[^`]+`',  # Inline code
-            r'(?:[^`]*?)```',  # Code blocks
-            r'```python\n[\s\S]*?\n```'  # Python code blocks
-        ]
-        # Combine all patterns into a single regex
-        self.combined_pattern = re.compile('|'.join(self.markdown_patterns))
-
-    def escape(self, text: str) -> str:
-        """
-        Escapes special characters in the text that are not part of MarkdownV2 syntax.
-
-        Args:
-            text (str): The input string with MarkdownV2 formatting.
-
-        Returns:
-            str: The escaped string safe for Telegram API.
-        """
-        if not text:
-            return text
-
-        # Find all MarkdownV2 syntax matches
-        matches = list(self.combined_pattern.finditer(text))
-
-        # Initialize variables
-        escaped_text = []
-        last_end = 0
-
-        for match in matches:
-            start, end = match.start(), match.end()
-            # Escape non-Markdown text before the current match
-            if last_end < start:
-                non_markdown_part = text[last_end:start]
-                escaped_non_markdown = self._escape_non_markdown(non_markdown_part)
-                escaped_text.append(escaped_non_markdown)
-            # Append the Markdown syntax without escaping
-            escaped_text.append(match.group())
-            last_end = end
-
-        # Escape any remaining non-Markdown text after the last match
-        if last_end < len(text):
-            remaining_text = text[last_end:]
-            escaped_remaining = self._escape_non_markdown(remaining_text)
-            escaped_text.append(escaped_remaining)
-
-        return ''.join(escaped_text)
-
-    def _escape_non_markdown(self, text: str) -> str:
-        """
-        Escapes special characters in non-Markdown text.
-
-        Args:
-            text (str): Text outside of Markdown syntax.
-
-        Returns:
-            str: Escaped text.
-        """
-        escaped = ''
-        for char in text:
-            if char in self.special_chars:
-                escaped += '\\' + char
-            else:
-                escaped += char
-        return escaped
 
 @dp.message(CommandStart())
 async def start(message: types.Message):
     """Обработка команды /start"""
-    logger.info(f"Start command from user_id={message.from_user.id}, username={message.from_user.username}")
+    logger.info(
+        "Start command from user_id=%s, username=%s",
+        message.from_user.id, message.from_user.username,
+        extra={"user_id": message.from_user.id}
+    )
 
     try:
         kb = [
@@ -140,14 +296,14 @@ async def start(message: types.Message):
         )
         logger.debug("Start command processed successfully")
 
-    except Exception as e:
-        logger.error(f"Error in start command: {e}\n{traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error in start command")
 
 
 @dp.message(F.text == "ℹ️ Консультация")
 async def info(message: types.Message):
     """Обработка кнопки помощи"""
-    logger.info(f"Help requested by user_id={message.from_user.id}")
+    logger.info("Help requested by user_id=%s", message.from_user.id, extra={"user_id": message.from_user.id})
 
     try:
         await message.answer(
@@ -157,33 +313,78 @@ async def info(message: types.Message):
         )
         logger.debug("Help message sent")
 
+    except Exception:
+        logger.exception("Error sending help message")
+
+
+async def send_logged(order_log: logging.LoggerAdapter, target: str, chat_id, send):
+    """
+    Awaits a send coroutine and logs its latency.
+
+    Args:
+        order_log (LoggerAdapter): Logger carrying the order context.
+        target (str): Recipient role for the log record (admin, manager, user).
+        chat_id: Recipient chat id.
+        send: Awaitable performing the Telegram request.
+    """
+    started = time.perf_counter()
+    try:
+        sent = await send
     except Exception as e:
-        logger.error(f"Error sending help message: {e}\n{traceback.format_exc()}")
+        order_log.error(
+            "Failed to send message to %s %s: %s", target, chat_id, e,
+            exc_info=True,
+            extra={"target": target, "chat_id": chat_id, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+        )
+        return None
+
+    order_log.info(
+        "Message sent to %s %s, message_id=%s", target, chat_id, sent.message_id,
+        extra={"target": target, "chat_id": chat_id, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+    )
+    return sent
 
 
 @dp.message(F.web_app_data)
 async def web_app_data_handler(message: types.Message):
     """Обработчик данных из WebApp с расширенным логированием"""
+    started = time.perf_counter()
+    user_log = ContextLogAdapter(logger, {"user_id": message.from_user.id})
     # Логируем получение данных
-    logger.info(
-        f"Received WebApp data from user_id={message.from_user.id}, "
-        f"username={message.from_user.username}"
+    user_log.info(
+        "Received WebApp data from user_id=%s, username=%s",
+        message.from_user.id, message.from_user.username
     )
-    logger.debug(f"Raw WebApp data: {message.web_app_data.data}")
+    user_log.debug("Raw WebApp data: %s", message.web_app_data.data)
 
     try:
         # Парсим полученные данные
         web_data = json.loads(message.web_app_data.data)
-        logger.info("Successfully parsed WebApp data")
-        logger.debug(f"Parsed data: {json.dumps(web_data, indent=2, ensure_ascii=False)}")
+        user_log.info("Successfully parsed WebApp data")
+        if logger.isEnabledFor(logging.DEBUG):
+            user_log.debug("Parsed data: %s", json.dumps(web_data, indent=2, ensure_ascii=False))
 
         # Извлекаем данные заказа
         items = web_data.get("items", [])
         total_amount = web_data.get("totalAmount", 0)
         timestamp = web_data.get("timestamp", 0)
+        order_log = ContextLogAdapter(logger, {"user_id": message.from_user.id, "order_id": timestamp})
 
         # Логируем детали заказа
-        logger.info(f"Order contains {len(items)} items, total: {total_amount} руб.")
+        order_log.info(
+            "Order contains %s items, total: %s руб.", len(items), total_amount,
+            extra={"items_count": len(items), "total_amount": total_amount}
+        )
+
+        # Проверяем заказ по каталогу и переоцениваем позиции
+        warnings = []
+        validation = await validate_order_items(items, total_amount)
+        if validation is not None:
+            items, total_amount, warnings = apply_order_validation(items, validation)
+            order_log.info(
+                "Order validated, catalog total: %s руб., warnings: %s", total_amount, len(warnings),
+                extra={"catalog_total": total_amount, "warnings_count": len(warnings)}
+            )
 
         # Инициализируем данные пользователя
         user_data = {
@@ -192,7 +393,7 @@ async def web_app_data_handler(message: types.Message):
             'last_name': message.from_user.last_name or '',
             'username': message.from_user.username or 'нет'
         }
-        logger.debug(f"User data: {user_data}")
+        order_log.debug("User data: %s", user_data)
 
         # Формируем полное имя пользователя
         full_name = f"{user_data['first_name']} {user_data['last_name']}".strip()
@@ -200,110 +401,55 @@ async def web_app_data_handler(message: types.Message):
         # Форматируем дату заказа
         order_date = datetime.fromtimestamp(timestamp / 1000).strftime("%d.%m.%Y %H:%M")
 
-        # Формируем сообщение-чек для администратора
-        admin_message = (
-            f"🛒 *НОВЫЙ ЗАКАЗ* {timestamp}\n\n"
-            f"👤 *Клиент:* [{full_name}]\n"
-            f"🔗 @{user_data['username']}\n"
-            f"🆔 ID: `{user_data['id']}`\n"
-            f"📅 *Дата:* {order_date}\n\n"
-            "📋 *Состав заказа:*\n"
-        )
-
-        # Добавляем товары в сообщение
-        for item in items:
-            admin_message += (
-                f"\n• {item['title']}\n"
-                f"  Размер: {item['size']}\n"
-                f"  Цвет: {item['color']}\n"
-                f"  Цена: {float(item['price']):.2f} руб × {item['quantity']} шт\n"
-            )
-
-        # Добавляем итоговую сумму
-        admin_message += (
-            f"\n💵 *Итого:* {float(total_amount):.2f} руб\n"
-            f"🚚 *Тип:* {'Предзаказ' if items[0].get('isPreOrder', False) else 'В наличии'}"
+        # Формируем сообщение-чек для администратора (поля экранируются при подстановке)
+        escaped_admin_message = build_admin_message(
+            timestamp, user_data, full_name, order_date, items, total_amount, warnings
         )
 
-        # Логируем сообщение для администратора
-        logger.debug(f"Admin message before escape:\n{admin_message}")
-
-        # Экранирование для MarkdownV2
-        escaper = MarkdownV2Escaper()
-        escaped_admin_message = escaper.escape(admin_message)
-
-        logger.debug(f"Admin message after escape:\n{escaped_admin_message}")
-
-        # Отправляем сообщение администратору
-        try:
-            admin_msg = await message.bot.send_message(
-                chat_id=ADMIN_CHAT_ID,
-                text=escaped_admin_message,
-                parse_mode="MarkdownV2",
-                disable_web_page_preview=True
-            )
-            logger.info(f"Admin message sent to chat {ADMIN_CHAT_ID}, message_id={admin_msg.message_id}")
-        except Exception as e:
-            logger.error(f"Failed to send message to admin {ADMIN_CHAT_ID}: {e}\n{traceback.format_exc()}")
-
-        try:
-            manager_msg = await message.bot.send_message(
-                chat_id=MANAGER_CHAT_ID,
-                text=escaped_admin_message,
-                parse_mode="MarkdownV2",
-                disable_web_page_preview=True
-            )
-            logger.info(f"Admin message sent to chat {MANAGER_CHAT_ID}, message_id={manager_msg.message_id}")
-        except Exception as e:
-            logger.error(f"Failed to send message to manager {MANAGER_CHAT_ID}: {e}\n{traceback.format_exc()}")
+        order_log.debug("Admin message:\n%s", escaped_admin_message)
+
+        # Отправляем сообщение администратору и менеджеру
+        await send_logged(order_log, "admin", ADMIN_CHAT_ID, message.bot.send_message(
+            chat_id=ADMIN_CHAT_ID,
+            text=escaped_admin_message,
+            parse_mode="MarkdownV2",
+            disable_web_page_preview=True
+        ))
+        await send_logged(order_log, "manager", MANAGER_CHAT_ID, message.bot.send_message(
+            chat_id=MANAGER_CHAT_ID,
+            text=escaped_admin_message,
+            parse_mode="MarkdownV2",
+            disable_web_page_preview=True
+        ))
 
         # Формируем сообщение для пользователя
-        user_message = (
-            "✅ *Спасибо за заказ*\n\n"
-            f"{full_name}, ваш заказ успешно оформлен.\n"
-            "Наш менеджер свяжется с вами в ближайшее время для уточнения деталей.\n\n"
-            f"*Номер заказа:* {timestamp}\n"
-            f"*Сумма заказа:* {float(total_amount):.2f} руб\n\n"
-            f"*Состав заказа:*\n"
+        escaped_user_message = build_user_message(timestamp, full_name, items, total_amount)
 
-        )
-        for item in items:
-            user_message += (
-                f" • {item['title']}\n"
-                f"  Размер: {item['size']}\n"
-                f"  Цвет: {item['color']}\n"
-                f"  Цена: {float(item['price']):.2f} руб × {item['quantity']} шт\n"
-            )
-        user_message += "\n💰*Оплата*: \nПереводом на карту"
-
-        logger.debug(f"User message before escape:\n{user_message}")
-
-        # Экранирование для MarkdownV2
-        escaped_user_message = escaper.escape(user_message)
-
-        logger.debug(f"User message after escape:\n{escaped_user_message}")
+        order_log.debug("User message:\n%s", escaped_user_message)
 
         # Отправляем подтверждение пользователю
-        try:
-            user_msg = await message.answer(
-                text=escaped_user_message,
-                parse_mode="MarkdownV2"
-            )
-            logger.info(f"Confirmation sent to user {user_data['id']}, message_id={user_msg.message_id}")
-        except Exception as e:
-            logger.error(f"Failed to send confirmation to user {user_data['id']}: {e}\n{traceback.format_exc()}")
+        await send_logged(order_log, "user", user_data['id'], message.answer(
+            text=escaped_user_message,
+            parse_mode="MarkdownV2"
+        ))
+
+        # Учитываем заказ в популярности товаров; ошибка не мешает оформлению
+        await record_order_items(items)
 
         # Логируем успешную обработку
-        logger.info(f"Order processed successfully for user_id={user_data['id']}")
+        order_log.info(
+            "Order processed successfully for user_id=%s", user_data['id'],
+            extra={"latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+        )
 
     except json.JSONDecodeError as e:
         error_msg = "Ошибка декодирования JSON данных"
-        logger.error(f"{error_msg}: {e}\nData: {message.web_app_data.data}\n{traceback.format_exc()}")
+        user_log.error("%s: %s\nData: %s", error_msg, e, message.web_app_data.data, exc_info=True)
         await message.answer("❌ Ошибка обработки данных заказа, пожалуйста, попробуйте еще раз")
 
     except Exception as e:
         error_msg = "Неизвестная ошибка при обработке заказа"
-        logger.error(f"{error_msg}: {e}\n{traceback.format_exc()}")
+        user_log.error("%s: %s", error_msg, e, exc_info=True)
 
         # Отправляем сообщение об ошибке
         await message.answer(
@@ -315,55 +461,215 @@ async def web_app_data_handler(message: types.Message):
 async def main() -> None:
     """Запуск бота с логированием"""
     logger.info("===== Starting bot =====")
-    logger.info(f"Bot token: {API_TOKEN[:5]}...{API_TOKEN[-5:]}")
-    logger.info(f"WebApp URL: {WEBAPP_URL}")
-    logger.info(f"Admin chat ID: {ADMIN_CHAT_ID}")
+    logger.info("Bot token: %s...%s", API_TOKEN[:5], API_TOKEN[-5:])
+    logger.info("WebApp URL: %s", WEBAPP_URL)
+    logger.info("Admin chat ID: %s", ADMIN_CHAT_ID)
 
     try:
         await dp.start_polling(bot)
         logger.info("Bot polling started")
-    except Exception as e:
-        logger.critical(f"Fatal error in bot: {e}\n{traceback.format_exc()}")
+    except Exception:
+        logger.critical("Fatal error in bot", exc_info=True)
     finally:
+        await close_http_session()
         logger.info("===== Bot stopped =====")
 
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
 
-if __name__ == "__main__":
-    os.makedirs("bot_logs", exist_ok=True)
 
-    log_date = datetime.now().strftime("%Y-%m-%d")
-    log_file_path = f"bot_logs/bot_{log_date}.log"
+class WebhookUpdateHandler:
+    """
+    Receives Telegram updates over a webhook and feeds them to the dispatcher.
 
-    from logging.handlers import TimedRotatingFileHandler
+    Updates are processed in background tasks; at most ``max_concurrency`` of them run
+    at once, further requests wait for a free slot before they are acknowledged.
+    """
 
-    # Основной логгер
-    logger = logging.getLogger("sneakerculture_bot")
-    logger.setLevel(logging.DEBUG)
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str, max_concurrency: int = 100):
+        if not secret_token:
+            # Без секрета любой, кто знает адрес, может слать поддельные обновления
+            raise ValueError("Webhook secret token is required")
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.max_concurrency = max_concurrency
+        self.accepting = True
+        self.tasks = set()
+        self._semaphore = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Создаём семафор внутри работающего цикла событий
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(
+            request.headers.get(SECRET_TOKEN_HEADER, ""), self.secret_token
+        ):
+            logger.warning("Rejected webhook request with invalid secret token from %s", request.remote)
+            return web.Response(status=401)
+
+        if not self.accepting:
+            # Telegram повторит доставку, другой воркер примет обновление
+            return web.Response(status=503)
 
-    # Формат логов
-    log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        try:
+            update = types.Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.error("Invalid webhook update: %s", e)
+            return web.Response(status=400)
 
-    # Ежедневный файл логов с датой в названии
-    file_handler = TimedRotatingFileHandler(
-        filename=log_file_path,
-        when="midnight",
-        interval=1,
-        backupCount=7,  # храним 7 последних логов
-        encoding="utf-8",
-        utc=False
+        await self.semaphore.acquire()
+        task = asyncio.create_task(self._process(update))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return web.Response(status=200)
+
+    async def _process(self, update: types.Update):
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception:
+            logger.exception(
+                "Error processing update %s", update.update_id, extra={"update_id": update.update_id}
+            )
+        finally:
+            self.semaphore.release()
+
+    async def drain(self, timeout: float):
+        """Stops accepting updates and waits for in-flight handlers to finish."""
+        self.accepting = False
+        if not self.tasks:
+            return
+        logger.info("Waiting for %s in-flight updates", len(self.tasks))
+        done, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning("Cancelled %s updates after %ss shutdown timeout", len(pending), timeout)
+
+
+def resolve_webhook_secret(settings: dict) -> str:
+    """
+    Returns the secret Telegram sends in the ``X-Telegram-Bot-Api-Secret-Token`` header.
+
+    Without a configured ``secret_token`` a random one is generated; it reaches Telegram
+    through setWebhook, so this is only possible when the bot registers ``url`` itself.
+
+    Raises:
+        RuntimeError: Neither ``secret_token`` nor ``url`` is configured.
+    """
+    if settings["secret_token"]:
+        return settings["secret_token"]
+    if not settings["url"]:
+        raise RuntimeError(
+            "WEBHOOK.secret_token is required when the webhook is registered outside the bot (no WEBHOOK.url)"
+        )
+    logger.info("WEBHOOK.secret_token is not set, generated a random one for this run")
+    return secrets.token_urlsafe(32)
+
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot, settings: dict, register_webhook: bool = True) -> web.Application:
+    """
+    Builds the aiohttp application serving the webhook endpoint.
+
+    Args:
+        dispatcher (Dispatcher): Dispatcher with registered handlers.
+        bot (Bot): Bot instance used to process updates.
+        settings (dict): WEBHOOK section of bot_settings.json with a non-empty ``secret_token``.
+        register_webhook (bool): Whether this worker calls setWebhook on startup.
+
+    Returns:
+        web.Application: The application; local tests can POST updates to ``settings["path"]``.
+    """
+    handler = WebhookUpdateHandler(
+        dispatcher,
+        bot,
+        secret_token=settings["secret_token"],
+        max_concurrency=settings["max_concurrency"],
     )
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(log_formatter)
+    app = web.Application()
+    app["update_handler"] = handler
+    app.router.add_post(settings["path"], handler.handle)
+
+    async def on_startup(app):
+        if register_webhook and settings["url"]:
+            await bot.set_webhook(
+                url=settings["url"],
+                secret_token=settings["secret_token"],
+                allowed_updates=dispatcher.resolve_used_update_types(),
+            )
+            logger.info("Webhook registered: %s", settings['url'])
+
+    async def on_shutdown(app):
+        await handler.drain(settings["shutdown_timeout"])
+
+    async def on_cleanup(app):
+        await close_http_session()
+        await bot.session.close()
+
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def run_webhook_worker(worker_index: int = 0, log_file_path: str = None, secret_token: str = None):
+    """Запуск одного воркера вебхука"""
+    workers = WEBHOOK_SETTINGS["workers"]
+    if log_file_path:
+        # Отдельный файл на воркер: ротация одного файла из нескольких процессов небезопасна
+        if workers > 1:
+            root, ext = os.path.splitext(log_file_path)
+            log_file_path = f"{root}_w{worker_index}{ext}"
+        setup_logging(log_file_path, LOG_LEVEL)
+    logger.info("===== Starting webhook worker %s/%s =====", worker_index + 1, workers)
+    settings = {**WEBHOOK_SETTINGS, "secret_token": secret_token or resolve_webhook_secret(WEBHOOK_SETTINGS)}
+    app = create_webhook_app(dp, bot, settings, register_webhook=worker_index == 0)
+    web.run_app(
+        app,
+        host=WEBHOOK_SETTINGS["host"],
+        port=WEBHOOK_SETTINGS["port"],
+        reuse_port=workers > 1,
+        shutdown_timeout=WEBHOOK_SETTINGS["shutdown_timeout"],
+        print=None,
+    )
+    logger.info("===== Webhook worker %s stopped =====", worker_index + 1)
 
-    # Логирование в консоль
-    stream_handler = logging.StreamHandler()
-    stream_handler.setLevel(logging.INFO)
-    stream_handler.setFormatter(log_formatter)
 
-    # Очищаем дубли
-    logger.handlers.clear()
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
+def run_webhook(log_file_path: str = None):
+    """Запуск бота в режиме вебхука; несколько воркеров делят один порт через SO_REUSEPORT"""
+    workers = WEBHOOK_SETTINGS["workers"]
+    # Один секрет на все воркеры: setWebhook вызывает только первый из них
+    secret_token = resolve_webhook_secret(WEBHOOK_SETTINGS)
+    if workers <= 1:
+        run_webhook_worker(0, log_file_path, secret_token)
+        return
+
+    processes = [
+        multiprocessing.Process(
+            target=run_webhook_worker, args=(index, log_file_path, secret_token), name=f"bot-worker-{index}"
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    log_date = datetime.now().strftime("%Y-%m-%d")
+    log_file_path = f"bot_logs/bot_{log_date}.log"
 
     # Запускаем бота
-    asyncio.run(main())
\ No newline at end of file
+    if BOT_MODE == "webhook":
+        run_webhook(log_file_path)
+    else:
+        setup_logging(log_file_path, LOG_LEVEL)
+        asyncio.run(main())
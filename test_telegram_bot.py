@@ -0,0 +1,136 @@
+# Тесты приёма обновлений вебхуком бота: python -m unittest test_telegram_bot
+# Настройки бота берутся из временного файла (BOT_SETTINGS_PATH), сеть не нужна
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+telegram_bot = None
+
+TEST_BOT_SETTINGS = {
+    "API_TOKEN": "123456:TEST-token",
+    "WEBAPP_URL": "https://example.com",
+    "ADMIN_CHAT_ID": 1,
+    "MANAGER_CHAT_ID": 2,
+}
+
+
+def setUpModule():
+    global telegram_bot
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as settings_file:
+        json.dump(TEST_BOT_SETTINGS, settings_file)
+    previous_path = os.environ.get("BOT_SETTINGS_PATH")
+    os.environ["BOT_SETTINGS_PATH"] = settings_file.name
+    try:
+        import telegram_bot as module
+    finally:
+        os.unlink(settings_file.name)
+        if previous_path is None:
+            del os.environ["BOT_SETTINGS_PATH"]
+        else:
+            os.environ["BOT_SETTINGS_PATH"] = previous_path
+    telegram_bot = module
+
+
+class BlockingDispatcher:
+    """Dispatcher stub whose handlers wait until ``release`` is set."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.updates = []
+
+    async def feed_update(self, bot, update):
+        self.updates.append(update.update_id)
+        await self.release.wait()
+
+
+class WebhookUpdateHandlerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dispatcher = BlockingDispatcher()
+        self.handler = telegram_bot.WebhookUpdateHandler(
+            self.dispatcher, telegram_bot.bot, secret_token="secret", max_concurrency=1
+        )
+        app = web.Application()
+        app.router.add_post("/webhook", self.handler.handle)
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        self.dispatcher.release.set()
+        await self.handler.drain(1)
+        await self.client.close()
+
+    def post(self, update_id=1, body=None, token="secret"):
+        headers = {telegram_bot.SECRET_TOKEN_HEADER: token} if token is not None else {}
+        if body is None:
+            body = json.dumps({"update_id": update_id})
+        return self.client.post("/webhook", data=body, headers=headers)
+
+    async def test_invalid_secret_token_is_rejected(self):
+        with self.assertLogs(telegram_bot.logger, "WARNING"):
+            for token in (None, "", "wrong"):
+                response = await self.post(token=token)
+                self.assertEqual(response.status, 401)
+        self.assertEqual(self.dispatcher.updates, [])
+
+    async def test_malformed_body_is_rejected(self):
+        with self.assertLogs(telegram_bot.logger, "ERROR"):
+            for body in ("not json", json.dumps({"update_id": "x"}), json.dumps([1])):
+                response = await self.post(body=body)
+                self.assertEqual(response.status, 400)
+        self.assertEqual(self.dispatcher.updates, [])
+
+    async def test_valid_update_is_processed(self):
+        response = await self.post(update_id=7)
+        self.assertEqual(response.status, 200)
+        await asyncio.sleep(0)
+        self.assertEqual(self.dispatcher.updates, [7])
+
+    async def test_concurrency_limit_delays_acknowledgement(self):
+        first = await self.post(update_id=1)
+        self.assertEqual(first.status, 200)
+
+        # Единственный слот занят: второе обновление ждёт и не подтверждается
+        second = asyncio.ensure_future(self.post(update_id=2))
+        await asyncio.sleep(0.2)
+        self.assertFalse(second.done())
+        self.assertEqual(self.dispatcher.updates, [1])
+
+        self.dispatcher.release.set()
+        self.assertEqual((await asyncio.wait_for(second, timeout=5)).status, 200)
+        await asyncio.sleep(0)
+        self.assertEqual(self.dispatcher.updates, [1, 2])
+
+    async def test_draining_handler_returns_503(self):
+        await self.handler.drain(1)
+        response = await self.post()
+        self.assertEqual(response.status, 503)
+
+
+class WebhookSecretTest(unittest.TestCase):
+    def settings(self, **overrides):
+        return {**telegram_bot.WEBHOOK_SETTINGS, "url": None, "secret_token": None, **overrides}
+
+    def test_handler_requires_secret(self):
+        with self.assertRaises(ValueError):
+            telegram_bot.WebhookUpdateHandler(BlockingDispatcher(), telegram_bot.bot, secret_token="")
+
+    def test_configured_secret_is_used(self):
+        self.assertEqual(telegram_bot.resolve_webhook_secret(self.settings(secret_token="configured")), "configured")
+
+    def test_secret_is_generated_when_bot_registers_webhook(self):
+        with self.assertLogs(telegram_bot.logger, "INFO"):
+            secret = telegram_bot.resolve_webhook_secret(self.settings(url="https://example.com/webhook"))
+        self.assertGreaterEqual(len(secret), 32)
+
+    def test_refuses_to_start_without_secret_and_url(self):
+        with self.assertRaises(RuntimeError):
+            telegram_bot.resolve_webhook_secret(self.settings())
+
+
+if __name__ == "__main__":
+    unittest.main()